@@ -0,0 +1,234 @@
+from __future__ import annotations
+import asyncio
+from contextlib import redirect_stdout
+from typing import Any
+
+import os
+import sys
+import io
+import time
+import json
+import argparse
+import platform
+import subprocess
+import statistics
+import tempfile
+try:
+    import resource # not available on Windows
+except ImportError:
+    resource = None
+
+import gbfpib
+from localcdn import LocalCDN
+
+# Benchmark of the party rendering, using synthetic exports and placeholder assets served locally
+# Each scenario runs in its own process, to measure its CPU time and peak memory usage
+
+# synthetic export scenarios
+# chara: number of characters, weapons: number of weapons (more than 10 for the extra grid), mods: number of modifiers
+SCENARIOS : dict[str, dict[str, int|bool]] = {
+    'normal':{'chara':5, 'weapons':10, 'mods':12},
+    'normal_nomod':{'chara':5, 'weapons':10, 'mods':0},
+    'normal_mod_small':{'chara':5, 'weapons':10, 'mods':17},
+    'normal_mod_mini':{'chara':5, 'weapons':10, 'mods':22},
+    'normal_mod_compact':{'chara':5, 'weapons':10, 'mods':30},
+    'normal_extra':{'chara':5, 'weapons':13, 'mods':12},
+    'extended':{'chara':8, 'weapons':10, 'mods':20},
+    'extended_extra':{'chara':8, 'weapons':13, 'mods':26},
+    'babyl':{'chara':12, 'weapons':10, 'mods':25},
+    'babyl_extra':{'chara':12, 'weapons':13, 'mods':30}
+}
+
+# build a synthetic party export
+def make_export(chara : int, weapons : int, mods : int) -> dict[str, Any]:
+    export : dict[str, Any] = {
+        'ver':2, 'lang':'en',
+        'p':100401, 'pcjs':'100401_sw_0_01', 'cml':30, 'cbl':'6', 'pce':1,
+        'ps':['Rage V', 'Armor Break', 'Miserable Mist'], 'cpl':None, 'fpl':None,
+        's':[], 'ss':[], 'se':[], 'sl':[], 'sp':[], 'ssm':2040094000, 'qs':1, 'satk':12345, 'shp':1234,
+        'watk':56789, 'whp':4321, 'est':[1, '1234567', '2345678'], 'estx':[['txt-gauge-num hp', 75]],
+        'sps':None, 'spsid':2040003000, 'wkey':{}
+    }
+    # characters
+    for k in ('c', 'cn', 'cl', 'cs', 'cp', 'cwr', 'ce', 'cst', 'ci'):
+        export[k] = []
+    export['cb'] = [0]
+    for i in range(chara):
+        cid : int = 3040000000 + (i + 1) * 1000
+        export['c'].append(cid)
+        export['cn'].append("Character {}".format(i + 1))
+        export['cl'].append(90 + i * 5)
+        export['cs'].append(5 + i % 2)
+        export['cp'].append(i * 50)
+        export['cwr'].append(i % 2 == 0)
+        export['ce'].append(1)
+        export['cst'].append(1)
+        export['ci'].append("{}_0{}".format(cid, 3 + i % 2) if i % 3 != 1 else "3710{:06}_01".format(i)) # some skins
+        export['cb'].append(i)
+    # summons
+    for i in range(7):
+        export['s'].append(2040000000 + i * 1000)
+        export['ss'].append("{}_02".format(2040000000 + i * 1000))
+        export['se'].append(3 + i % 4)
+        export['sl'].append(150)
+        export['sp'].append(99 if i == 0 else 0)
+    # weapons
+    for k in ('w', 'wl', 'wp', 'wsm', 'wsn', 'waxt', 'waxi', 'wax', 'wakn'):
+        export[k] = []
+    for i in range(weapons):
+        export['w'].append("1040{:06}".format(i * 100))
+        export['wl'].append(15 if i % 4 else 20)
+        export['wp'].append(99 if i % 2 else 0)
+        export['wsm'].append(1040999900 if i == 0 else None)
+        export['wsn'].append(["skill_atk_{}".format(i % 3), "skill_hp_{}".format(i % 2), "skill_ca" if i % 3 == 0 else None])
+        if i % 4 == 2: # ax
+            export['waxt'].append(['1588'])
+            export['waxi'].append(['1588_1', '1589_1'])
+            export['wax'].append([[{'show_value':'+3%'}, {'show_value':'+1'}]])
+        else:
+            export['waxt'].append([])
+            export['waxi'].append([])
+            export['wax'].append([])
+        export['wakn'].append({'is_arousal_weapon':True, 'level':10, 'form':(i % 3) + 1} if i % 4 == 3 else None)
+    # modifiers
+    export['mods'] = [{'icon_img':'{}.png'.format(i), 'value':'{}%'.format(i * 5), 'is_max':i % 3 == 0} for i in range(mods)]
+    return export
+
+# synthetic EMP and artifact data for a character
+def make_emp(cid : str, index : int) -> dict[str, Any]:
+    return {
+        'lang':'en', 'id':cid,
+        'emp':[{'image':'{}_{}'.format(cid, j), 'current_level':j % 4, 'is_lock':j >= 18} for j in range(20 if index % 2 else 15)],
+        'ring':[{'type':{'image':'bonus_{}'.format(j + 1), 'name':'Stat {}'.format(j)}, 'param':{'disp_total_param':'+{}%'.format(j * 5)}} for j in range(4)],
+        'awakening':'lv{}'.format(index + 1), 'awaktype':['Attack', 'Defense', 'Multiattack', 'Balanced'][index % 4],
+        'domain':[['a', 'b', 'c']] if index % 2 else [], 'saint':[], 'extra':[]
+    }
+
+def make_artifact(cid : str, index : int) -> dict[str, Any]:
+    return {
+        'lang':'en', 'id':cid,
+        'artifact':{
+            'img':'30100{}.jpg'.format(index),
+            'skills':[{'icon':'{}.png'.format(j + 1), 'lvl':str(j + 1), 'value':'+{}%'.format(j * 3), 'desc':'Skill description number {}'.format(j)} for j in range(4)]
+        }
+    }
+
+# run a scenario in the current process, renders is the number of successive renders
+# the first render is cold (empty caches), the next ones are warm
+def run_scenario(name : str, endpoint : str, quality : str, renders : int, parallel : bool) -> dict[str, Any]:
+    scenario : dict[str, int|bool] = SCENARIOS[name]
+    result : dict[str, Any] = {'wall':[], 'cpu':[], 'assets':[]}
+    async def render() -> None:
+        g : gbfpib.GBFPIB = gbfpib.GBFPIB()
+        g.settings = {'endpoint':endpoint, 'quality':quality, 'caching':False, 'skin':True, 'emp':True, 'artifact':True, 'hp':True, 'parallel':parallel}
+        async with g.init_client():
+            with tempfile.TemporaryDirectory() as folder:
+                g.output_folder = folder
+                for i in range(renders):
+                    export : dict[str, Any] = make_export(scenario['chara'], scenario['weapons'], scenario['mods'])
+                    for j in range(scenario['chara']):
+                        cid : str = g.get_character_look(export, j).split('_')[0]
+                        g.emp_cache[cid] = make_emp(cid, j)
+                        g.artifact_cache[cid] = make_artifact(cid, j)
+                    wall : float = time.perf_counter()
+                    cpu : float = time.process_time()
+                    with redirect_stdout(io.StringIO()):
+                        await g.generate_party(export)
+                    result['wall'].append(time.perf_counter() - wall)
+                    result['cpu'].append(time.process_time() - cpu)
+                    result['assets'].append(g.profiler.tiers.get('network', {}).get('calls', 0))
+    asyncio.run(render())
+    result['peak_rss'] = None
+    if resource is not None:
+        result['peak_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == "darwin" else 1024) # in bytes
+    return result
+
+# run a scenario in a new process
+def run_child(name : str, endpoint : str, quality : str, renders : int, parallel : bool) -> dict[str, Any]:
+    process : subprocess.CompletedProcess = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", name, "--endpoint", endpoint, "--quality", quality, "--renders", str(renders)] + (["--paralleldraw"] if parallel else []),
+        capture_output=True,
+        text=True
+    )
+    if process.returncode != 0:
+        raise Exception("Scenario {} failed:\n{}".format(name, process.stderr))
+    return json.loads(process.stdout.strip().split("\n")[-1])
+
+# compare the results with a baseline and print the differences
+def compare(results : dict[str, Any], baseline : dict[str, Any]) -> None:
+    print("")
+    print("Comparison with the baseline ({}, {})".format(baseline.get('date', '?'), baseline.get('quality', '?')))
+    for name, r in results['scenarios'].items():
+        b : dict[str, Any]|None = baseline['scenarios'].get(name, None)
+        if b is None:
+            print("{:<20} not in the baseline".format(name))
+            continue
+        line : list[str] = []
+        for key in ('cold', 'warm', 'cpu', 'peak_rss'):
+            if r.get(key, None) is None or not b.get(key, None):
+                continue
+            line.append("{} {:+.1f}%".format(key, (r[key] - b[key]) * 100 / b[key]))
+        print("{:<20} {}".format(name, ", ".join(line)))
+
+def main() -> None:
+    parser : argparse.ArgumentParser = argparse.ArgumentParser(description="Benchmark of the Granblue Fantasy Party Image Builder, with synthetic exports.")
+    parser.add_argument('-s', '--scenario', help="scenarios to run. All by default.", nargs='+', choices=list(SCENARIOS.keys()), metavar='NAME')
+    parser.add_argument('-q', '--quality', help="set the image size. Default is %(default)s", choices=['1080p', '720p', '4k'], default='4k')
+    parser.add_argument('-n', '--renders', help="number of successive renders per process, the first one being cold. Default is %(default)s", type=int, default=3)
+    parser.add_argument('-o', '--output', help="save the results in the given JSON file (to use as a baseline).", metavar='FILE')
+    parser.add_argument('-c', '--compare', help="compare the results with the given baseline.", metavar='FILE')
+    parser.add_argument('-pd', '--paralleldraw', help="draw each part of the image on its own thread.", action='store_true')
+    parser.add_argument('-l', '--latency', help="add a delay to every request of the local CDN, in milliseconds. Default is %(default)s", type=float, default=0)
+    parser.add_argument('-f', '--folder', help="serve the recorded assets of this folder instead of placeholders (see localcdn.py).", metavar='FOLDER')
+    parser.add_argument('--endpoint', help=argparse.SUPPRESS)
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args : argparse.Namespace = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__))) # the assets are loaded from relative paths
+    if args.child is not None:
+        print(json.dumps(run_scenario(args.child, args.endpoint, args.quality, args.renders, args.paralleldraw)))
+        return
+
+    cdn : LocalCDN = LocalCDN(folder=args.folder, latency=args.latency / 1000, seed=0)
+    endpoint : str = cdn.start_thread()
+    print("Local CDN running at", endpoint)
+    results : dict[str, Any] = {
+        'version':gbfpib.GBFPIB.VERSION,
+        'date':time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'python':platform.python_version(),
+        'platform':platform.platform(),
+        'quality':args.quality,
+        'renders':args.renders,
+        'latency':args.latency,
+        'parallel':args.paralleldraw,
+        'scenarios':{}
+    }
+    print("{:<20} {:>9} {:>9} {:>9} {:>10} {:>7}".format("Scenario", "Cold (s)", "Warm (s)", "CPU (s)", "Peak RSS", "Assets"))
+    for name in (args.scenario or SCENARIOS.keys()):
+        r : dict[str, Any] = run_child(name, endpoint, args.quality, args.renders, args.paralleldraw)
+        data : dict[str, Any] = {
+            'cold':r['wall'][0],
+            'warm':statistics.median(r['wall'][1:]) if len(r['wall']) > 1 else None,
+            'cpu':r['cpu'][0],
+            'peak_rss':r['peak_rss'],
+            'assets':r['assets'][0],
+            'runs':r
+        }
+        results['scenarios'][name] = data
+        print("{:<20} {:>9.3f} {:>9} {:>9.3f} {:>10} {:>7}".format(
+            name,
+            data['cold'],
+            "-" if data['warm'] is None else "{:.3f}".format(data['warm']),
+            data['cpu'],
+            "-" if data['peak_rss'] is None else "{:.1f} MB".format(data['peak_rss'] / 1048576),
+            data['assets']
+        ))
+    if args.output is not None:
+        with open(args.output, mode="w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+        print("Results saved to", args.output)
+    if args.compare is not None:
+        with open(args.compare, mode="r", encoding="utf-8") as f:
+            compare(results, json.load(f))
+
+if __name__ == "__main__":
+    main()
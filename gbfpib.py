@@ -1,28 +1,38 @@
 from __future__ import annotations
 import asyncio
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 from dataclasses import dataclass
 from enum import IntEnum
 
-from typing import Generator
+from typing import Generator, Callable, Coroutine, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 import time
 import os
+import random
 import sys
 import traceback
+import threading
 import argparse
 
-from base64 import b64encode
+from base64 import b64decode
+import hashlib
 
 import json
-from io import BytesIO
+from io import BytesIO, RawIOBase
+import tempfile
+import zipfile
+import mmap
+import struct
 
 import importlib.util
 
 # third party
 import aiohttp
-from PIL import Image, ImageFont, ImageDraw
+from aiohttp import web
+from PIL import Image, ImageFont, ImageDraw, PngImagePlugin
 import pyperclip
 
 # class to manipulate a vector2-type structure (X, Y)
@@ -111,6 +121,10 @@ class IMG():
                 self.buffer = BytesIO(src) # need a readable buffer for it, and it must stays alive
                 self.image = Image.open(self.buffer)
                 self.convert("RGBA")
+            case memoryview(): # bytes of a memory mapped file, read without copying them
+                self.buffer = MemoryReader(src)
+                self.image = Image.open(self.buffer)
+                self.convert("RGBA")
             case IMG(): # another IMG wrapper
                 self.image = src.image.copy()
             case _: # an Image instance. NOTE: I use 'case _' because of how import Pillow, the type isn't loaded at this point
@@ -152,6 +166,940 @@ class IMG():
     def alpha(self : IMG, layer : IMG) -> IMG:
         return IMG(Image.alpha_composite(self.image, layer.image))
 
+    # alpha composite a layer in place, at the given offset
+    # only the area covered by the layer is processed
+    def alpha_at(self : IMG, layer : IMG, offset : tuple[int, int]) -> None:
+        x : int = int(offset[0])
+        y : int = int(offset[1])
+        # clip to our bounds
+        left : int = max(0, -x)
+        top : int = max(0, -y)
+        right : int = min(layer.image.width, self.image.width - x)
+        bottom : int = min(layer.image.height, self.image.height - y)
+        if right > left and bottom > top:
+            self.image.alpha_composite(layer.image, (x + left, y + top), (left, top, right, bottom))
+
+# a paste operation of a display list
+# image is already cropped and resized, offset is in the image space
+# blend is True to alpha composite the image, False to paste it with its alpha as the mask
+class PasteOp():
+    def __init__(self : PasteOp, layers : tuple[int, ...], source : str|None, image : IMG, offset : tuple[int, int], blend : bool) -> None:
+        self.layers : tuple[int, ...] = layers
+        self.source : str|None = source # asset path, None for an image generated at runtime
+        self.image : IMG = image
+        self.offset : tuple[int, int] = offset
+        self.blend : bool = blend
+
+    # area covered on the canvas
+    def box(self : PasteOp) -> tuple[int, int, int, int]:
+        return (self.offset[0], self.offset[1], self.offset[0] + self.image.image.width, self.offset[1] + self.image.image.height)
+
+    def to_json(self : PasteOp) -> dict:
+        return {'op':"alpha" if self.blend else "paste", 'layers':list(self.layers), 'source':self.source, 'box':list(self.box())}
+
+# a text operation of a display list
+# method is the name of the ImageDraw method to call, args and kwargs are already in the image space
+class TextOp():
+    BOX_ARGS : tuple[str, ...] = ('font', 'anchor', 'spacing', 'align', 'direction', 'features', 'language', 'stroke_width', 'embedded_color')
+
+    def __init__(self : TextOp, layers : tuple[int, ...], method : str, args : tuple, kwargs : dict) -> None:
+        self.layers : tuple[int, ...] = layers
+        self.method : str = method
+        self.args : tuple = args
+        self.kwargs : dict = kwargs
+
+    # area covered on the canvas, draw is only used to measure the text
+    def box(self : TextOp, draw : ImageDraw.ImageDraw) -> tuple[int, int, int, int]:
+        kwargs : dict = {k:v for k, v in self.kwargs.items() if k in self.BOX_ARGS}
+        box : tuple = getattr(draw, self.method.replace("text", "textbbox"))(*self.args[:2], **kwargs)
+        # floor and ceil, with a pixel of margin for the antialiasing
+        return (int(box[0]) - 1, int(box[1]) - 1, -int(-box[2]) + 1, -int(-box[3]) + 1)
+
+    def to_json(self : TextOp) -> dict:
+        data : dict = {'op':self.method, 'layers':list(self.layers), 'position':list(self.args[0]), 'text':self.args[1]}
+        for k, v in self.kwargs.items():
+            if k == 'font':
+                data[k] = "{} {}".format(os.path.basename(v.path), v.size)
+            elif isinstance(v, tuple):
+                data[k] = list(v)
+            else:
+                data[k] = v
+        return data
+
+# list of the drawing operations of a section, in drawing order, on a number of layers
+# the make_* functions record their operations in it, and GBFPIB.rasterize() draws them
+# the first layer is the base layer (for party.png), the next ones are overlays (for skin.png)
+class DisplayList():
+    def __init__(self : DisplayList, count : int) -> None:
+        self.count : int = count # number of layers
+        self.ops : list[PasteOp|TextOp] = []
+
+    def add(self : DisplayList, op : PasteOp|TextOp) -> None:
+        self.ops.append(op)
+
+    # layers of the given range which are drawn
+    def targets(self : DisplayList, indexes : range) -> tuple[int, ...]:
+        return tuple(i for i in indexes if i < self.count)
+
+    # operations drawn on the given layer
+    def layer(self : DisplayList, index : int) -> list[PasteOp|TextOp]:
+        return [op for op in self.ops if index in op.layers]
+
+    def to_json(self : DisplayList) -> dict:
+        return {'layers':self.count, 'ops':[op.to_json() for op in self.ops]}
+
+# overlay layer only made of the areas where it isn't transparent
+# the patches don't overlap, so compositing them one by one is the same as compositing the whole layer
+class SparseLayer():
+    def __init__(self : SparseLayer) -> None:
+        self.patches : list[tuple[tuple[int, int], IMG]] = [] # offset and image of each patch
+
+    def add(self : SparseLayer, offset : tuple[int, int], patch : IMG) -> None:
+        self.patches.append((offset, patch))
+
+    # composite the layer on an image, in place
+    def apply(self : SparseLayer, img : IMG) -> None:
+        for offset, patch in self.patches:
+            img.alpha_at(patch, offset)
+
+# read-only file over a memoryview, so Pillow can decode it in place
+class MemoryReader(RawIOBase):
+    def __init__(self : MemoryReader, view : memoryview) -> None:
+        super().__init__()
+        self.view : memoryview = view
+        self.position : int = 0
+
+    def readable(self : MemoryReader) -> bool:
+        return True
+
+    def seekable(self : MemoryReader) -> bool:
+        return True
+
+    def readinto(self : MemoryReader, buffer : Any) -> int:
+        size : int = min(len(buffer), len(self.view) - self.position)
+        if size <= 0:
+            return 0
+        buffer[:size] = self.view[self.position:self.position+size]
+        self.position += size
+        return size
+
+    def seek(self : MemoryReader, offset : int, whence : int = os.SEEK_SET) -> int:
+        match whence:
+            case os.SEEK_CUR:
+                offset += self.position
+            case os.SEEK_END:
+                offset += len(self.view)
+        self.position = max(0, offset)
+        return self.position
+
+    def tell(self : MemoryReader) -> int:
+        return self.position
+
+# in-memory LRU cache, limited by the total weight of its entries
+# by default, the weight is the size in bytes of the decoded image
+# pinned entries are never evicted
+class MemoryCache():
+    def __init__(self : MemoryCache, max_size : int, weigh : Callable[[Any], int]|None = None) -> None:
+        self.max_size : int = max_size
+        self.weigh : Callable[[Any], int] = weigh if weigh is not None else self.image_size
+        self.entries : OrderedDict[str, Any] = OrderedDict() # least recently used first
+        self.weights : dict[str, int] = {}
+        self.pinned : set[str] = set()
+        self.size : int = 0
+        self.hits : int = 0
+        self.misses : int = 0
+        self.evictions : int = 0
+
+    # decoded size of an IMG (or of a list of IMG)
+    def image_size(self : MemoryCache, img : IMG|SparseLayer|list[IMG|SparseLayer]) -> int:
+        if isinstance(img, list):
+            return sum(self.image_size(i) for i in img)
+        if isinstance(img, SparseLayer):
+            return sum(self.image_size(patch) for offset, patch in img.patches)
+        return img.image.width * img.image.height * len(img.image.getbands())
+
+    def __contains__(self : MemoryCache, key : str) -> bool:
+        return key in self.entries
+
+    def __len__(self : MemoryCache) -> int:
+        return len(self.entries)
+
+    def __getitem__(self : MemoryCache, key : str) -> Any:
+        value : Any = self.entries[key]
+        self.entries.move_to_end(key)
+        return value
+
+    def __setitem__(self : MemoryCache, key : str, value : Any) -> None:
+        self.set(key, value)
+
+    def get(self : MemoryCache, key : str, default : Any = None) -> Any:
+        if key in self.entries:
+            return self[key]
+        return default
+
+    # like get() but counts hits and misses
+    def lookup(self : MemoryCache, key : str) -> Any:
+        if key in self.entries:
+            self.hits += 1
+            return self[key]
+        self.misses += 1
+        return None
+
+    # add an entry, pinned entries will never be evicted
+    def set(self : MemoryCache, key : str, value : Any, pin : bool = False) -> None:
+        if key in self.entries:
+            self.size -= self.weights[key]
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.weights[key] = self.weigh(value)
+        self.size += self.weights[key]
+        if pin:
+            self.pinned.add(key)
+        self.evict()
+
+    # remove the least recently used entries until the cache fits in its budget
+    def evict(self : MemoryCache) -> None:
+        if self.size <= self.max_size:
+            return
+        for key in list(self.entries.keys()):
+            if self.size <= self.max_size:
+                break
+            if key in self.pinned:
+                continue
+            del self.entries[key]
+            self.size -= self.weights.pop(key)
+            self.evictions += 1
+
+    def clear(self : MemoryCache) -> None:
+        self.entries.clear()
+        self.weights.clear()
+        self.pinned.clear()
+        self.size = 0
+
+    # return statistics about the cache
+    def stats(self : MemoryCache) -> dict[str, int]:
+        return {
+            'entries':len(self.entries),
+            'pinned':len(self.pinned),
+            'size':self.size,
+            'max_size':self.max_size,
+            'hits':self.hits,
+            'misses':self.misses,
+            'evictions':self.evictions
+        }
+
+# write a JSON file through a temporary file, so a crash during the write doesn't leave it truncated
+def write_json(filename : str, data : Any) -> None:
+    tmp : str = filename + ".tmp"
+    with open(tmp, mode="w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, filename)
+
+# CDN paths known to be missing (404 errors and failed class probes), to not request them again
+# entries expire after ttl seconds, as missing assets can be added by a game update
+class NegativeCache():
+    FILE : str = "missing.json"
+    # default time to live of the entries, in seconds
+    TTL : int = 24 * 3600
+
+    def __init__(self : NegativeCache, folder : str) -> None:
+        self.folder : str = folder
+        self.ttl : float = self.TTL
+        self.entries : dict[str, float] = {} # path and expiration time
+        self.loaded : bool = False
+        self.modified : bool = False
+        self.added : int = 0
+        self.saved : int = 0 # number of requests avoided
+
+    # load the entries saved by a previous run, the folder must exist
+    def load(self : NegativeCache) -> None:
+        if self.loaded:
+            return
+        self.loaded = True
+        try:
+            with open(self.folder + "/" + self.FILE, mode="r", encoding="utf-8") as f:
+                now : float = time.time()
+                self.entries = {k: v for k, v in json.load(f).items() if v > now} | self.entries
+        except:
+            pass
+
+    def save(self : NegativeCache) -> None:
+        if not self.loaded or not self.modified:
+            return
+        try:
+            now : float = time.time()
+            write_json(self.folder + "/" + self.FILE, {k: v for k, v in self.entries.items() if v > now})
+            self.modified = False
+        except Exception as e:
+            print("Failed to save the missing asset list:", e)
+
+    # return True if the path is known to be missing, and count it as a saved request
+    def lookup(self : NegativeCache, path : str) -> bool:
+        expiration : float|None = self.entries.get(path, None)
+        if expiration is None or self.ttl <= 0:
+            return False
+        if expiration < time.time():
+            del self.entries[path]
+            self.modified = True
+            return False
+        self.saved += 1
+        return True
+
+    def add(self : NegativeCache, path : str) -> None:
+        if self.ttl <= 0:
+            return
+        self.entries[path] = time.time() + self.ttl
+        self.modified = True
+        self.added += 1
+
+    # return statistics about the cache
+    def stats(self : NegativeCache) -> dict[str, int]:
+        return {
+            'entries':len(self.entries),
+            'added':self.added,
+            'saved':self.saved
+        }
+
+# on-disk asset cache
+# files are stored in sharded folders, named after a hash of their path
+# an index file keeps track of the size, last access and source url of each entry
+class DiskCache():
+    INDEX_FILE : str = "index.json"
+    # entries used at least this many times are evicted last
+    HOT_USES : int = 5
+    # entries in those folders are evicted last (skill icons, emp icons...)
+    HOT_FOLDERS : tuple[str, ...] = ("/ui/icon/", "/zenith/")
+
+    def __init__(self : DiskCache, folder : str) -> None:
+        self.folder : str = folder
+        self.index : dict[str, dict] = None # loaded on first use
+        self.modified : bool = False
+        self.hits : int = 0
+        self.misses : int = 0
+        self.writes : int = 0
+        self.missing : NegativeCache = NegativeCache(folder) # saved and loaded with the index
+        self.lock : threading.RLock = threading.RLock() # the index is accessed from the I/O threads
+
+    # hashed name of an asset path
+    def key(self : DiskCache, path : str) -> str:
+        return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+    # location of an entry on disk
+    def file_path(self : DiskCache, key : str) -> str:
+        return "{}/{}/{}".format(self.folder, key[:2], key)
+
+    # load the index (if not loaded) and create the cache folder if needed
+    def load(self : DiskCache) -> None:
+        if self.index is not None:
+            return
+        with self.lock:
+            if self.index is not None:
+                return
+            if not os.path.isdir(self.folder):
+                os.mkdir(self.folder)
+            index : dict[str, dict]
+            try:
+                with open(self.folder + "/" + self.INDEX_FILE, mode="r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except:
+                index = {}
+            self.index = index
+            self.migrate()
+            self.missing.load()
+
+    # move files from the old flat layout (base64 file names) into the new one
+    def migrate(self : DiskCache) -> None:
+        for entry in os.scandir(self.folder):
+            if not entry.is_file() or entry.name in (self.INDEX_FILE, NegativeCache.FILE):
+                continue
+            try:
+                path : str = b64decode(entry.name.encode('utf-8')).decode('utf-8')
+                with open(entry.path, "rb") as f:
+                    self.insert(path, f.read(), None)
+            except:
+                pass
+            try:
+                os.remove(entry.path)
+            except:
+                pass
+
+    # save the index if it changed
+    def save(self : DiskCache) -> None:
+        self.missing.save()
+        if self.index is None or not self.modified:
+            return
+        try:
+            with self.lock:
+                write_json(self.folder + "/" + self.INDEX_FILE, self.index)
+                self.modified = False
+        except Exception as e:
+            print("Failed to save the disk cache index:", e)
+
+    # return the file content for the given asset path, or None if not cached
+    def lookup(self : DiskCache, path : str) -> bytes|None:
+        self.load()
+        key : str = self.key(path)
+        if key not in self.index:
+            with self.lock:
+                self.misses += 1
+            return None
+        try:
+            with open(self.file_path(key), "rb") as f:
+                data : bytes = f.read()
+        except OSError: # file is gone, clean up the index
+            with self.lock:
+                self.index.pop(key, None)
+                self.modified = True
+                self.misses += 1
+            return None
+        with self.lock:
+            entry : dict|None = self.index.get(key, None)
+            if entry is not None:
+                entry['access'] = time.time()
+                entry['uses'] = entry.get('uses', 0) + 1
+            self.modified = True
+            self.hits += 1
+        return data
+
+    # check if an asset path is cached, without reading it
+    def contains(self : DiskCache, path : str) -> bool:
+        self.load()
+        return self.key(path) in self.index
+
+    # store the file content for the given asset path
+    def insert(self : DiskCache, path : str, data : bytes, url : str|None) -> None:
+        self.load()
+        key : str = self.key(path)
+        fp : str = self.file_path(key)
+        os.makedirs(fp.rsplit('/', 1)[0], exist_ok=True)
+        # write through a temporary file (one per thread, as the same key can be written twice at once)
+        # so an interrupted write doesn't leave a truncated file in place of the indexed one
+        tmp : str = "{}.{}.tmp".format(fp, threading.get_ident())
+        try:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, fp)
+        except:
+            try: os.remove(tmp)
+            except: pass
+            raise
+        with self.lock:
+            self.index[key] = {'path':path, 'url':url, 'size':len(data), 'access':time.time(), 'uses':1}
+            self.modified = True
+            self.writes += 1
+
+    # check if an entry must be kept over others
+    def is_hot(self : DiskCache, entry : dict) -> bool:
+        return entry.get('uses', 0) >= self.HOT_USES or any(f in entry['path'] for f in self.HOT_FOLDERS)
+
+    # remove entries until the cache fits in max_size bytes
+    # the least recently used entries go first, hot entries are only removed once no others remain
+    # return the number of files and bytes removed
+    def evict(self : DiskCache, max_size : int) -> tuple[int, int]:
+        self.load()
+        with self.lock:
+            size : int = sum(e['size'] for e in self.index.values())
+            if size <= max_size:
+                return 0, 0
+            order : list[str] = sorted(self.index.keys(), key=lambda k: (self.is_hot(self.index[k]), self.index[k]['access']))
+            count : int = 0
+            freed : int = 0
+            for key in order:
+                if size - freed <= max_size:
+                    break
+                try:
+                    os.remove(self.file_path(key))
+                except OSError:
+                    pass
+                freed += self.index[key]['size']
+                count += 1
+                del self.index[key]
+            self.modified = True
+            return count, freed
+
+    # return statistics about the cache
+    def stats(self : DiskCache) -> dict[str, int]:
+        self.load()
+        with self.lock:
+            size : int = sum(e['size'] for e in self.index.values())
+        return {
+            'files':len(self.index),
+            'size':size,
+            'hits':self.hits,
+            'misses':self.misses,
+            'writes':self.writes
+        }
+
+# read-only pack of assets, memory mapped
+# the header is followed by a table of (SHA-1 of the path, offset, size) sorted by hash, then by the file contents
+# lookups are binary searches in the mapped table, so opening a pack doesn't depend on its number of files
+# a pack stays mapped for the lifetime of the process, as the decoded images can keep views on its content
+class AssetPack():
+    MAGIC : bytes = b"GBFPACK1"
+    HEADER : struct.Struct = struct.Struct("<8sI4x")
+    ENTRY : struct.Struct = struct.Struct("<20sQI")
+    # prefix of our local assets (the other keys are CDN paths)
+    LOCAL_PREFIX : str = "local|"
+
+    def __init__(self : AssetPack, filename : str) -> None:
+        self.filename : str = filename
+        with open(filename, "rb") as f:
+            self.map : mmap.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = self.HEADER.unpack_from(self.map, 0)
+        if magic != self.MAGIC:
+            self.map.close()
+            raise Exception("{} isn't an asset pack".format(filename))
+        self.view : memoryview = memoryview(self.map)
+
+    # hash of an asset path
+    def key(self : AssetPack, path : str) -> bytes:
+        return hashlib.sha1(path.encode('utf-8')).digest()
+
+    # return the offset and size of an asset, or None if it isn't in the pack
+    def find(self : AssetPack, path : str) -> tuple[int, int]|None:
+        key : bytes = self.key(path)
+        low : int = 0
+        high : int = self.count
+        while low < high:
+            middle : int = (low + high) // 2
+            position : int = self.HEADER.size + middle * self.ENTRY.size
+            k : bytes = self.map[position:position+20]
+            if k < key:
+                low = middle + 1
+            elif k > key:
+                high = middle
+            else:
+                _, offset, size = self.ENTRY.unpack_from(self.map, position)
+                return offset, size
+        return None
+
+    def __contains__(self : AssetPack, path : str) -> bool:
+        return self.find(path) is not None
+
+    def __len__(self : AssetPack) -> int:
+        return self.count
+
+    # return a view on the asset content (not a copy), or None
+    def lookup(self : AssetPack, path : str) -> memoryview|None:
+        r : tuple[int, int]|None = self.find(path)
+        if r is None:
+            return None
+        return self.view[r[0]:r[0]+r[1]]
+
+    # write a pack from a list of (key, file path) pairs
+    # return the number of files and the pack size
+    @classmethod
+    def build(cls : type[AssetPack], filename : str, files : list[tuple[str, str]]) -> tuple[int, int]:
+        entries : dict[bytes, str] = {}
+        for path, fp in files:
+            entries[hashlib.sha1(path.encode('utf-8')).digest()] = fp
+        keys : list[bytes] = sorted(entries.keys())
+        tmp : str = filename + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, len(keys)))
+            f.write(bytes(cls.ENTRY.size * len(keys))) # table, written once the offsets are known
+            table : list[bytes] = []
+            offset : int = f.tell()
+            for key in keys:
+                with open(entries[key], "rb") as src:
+                    data : bytes = src.read()
+                f.write(data)
+                table.append(cls.ENTRY.pack(key, offset, len(data)))
+                offset += len(data)
+            f.seek(cls.HEADER.size)
+            f.write(b"".join(table))
+        os.replace(tmp, filename)
+        return len(keys), offset
+
+# where GBFPIB.get() looks for an asset
+# sources are tried in order, the first one returning the asset wins and the previous ones can keep a copy
+class AssetSource():
+    name : str = "source"
+    remote : bool|None = True # True if it serves CDN paths, False for local paths, None for both
+
+    def __init__(self : AssetSource) -> None:
+        self.hits : int = 0
+        self.misses : int = 0
+        self.bytes : int = 0
+        self.probes : int = 0
+        self.pool : ThreadPoolExecutor|None = None # set by GBFPIB.get_sources()
+
+    # run a blocking call (file access...) in the I/O thread pool
+    async def run(self : AssetSource, func : Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.pool, func, *args)
+
+    # check if the source serves this kind of path
+    def serves(self : AssetSource, remote : bool) -> bool:
+        return self.remote is None or self.remote == remote
+
+    # return the asset content (or the decoded image for the memory source), None if not found
+    async def fetch(self : AssetSource, path : str) -> bytes|memoryview|IMG|None:
+        return None
+
+    # check if the asset exists, without retrieving it
+    async def exists(self : AssetSource, path : str) -> bool|None:
+        return None
+
+    # keep a copy of an asset found by a later source
+    async def store(self : AssetSource, path : str, data : bytes|memoryview, img : IMG, origin : AssetSource) -> None:
+        pass
+
+    # return the url of the asset, for assets downloaded from this source
+    def url(self : AssetSource, path : str) -> str|None:
+        return None
+
+    # count a fetch result
+    def count(self : AssetSource, data : bytes|memoryview|IMG|None) -> bytes|memoryview|IMG|None:
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if not isinstance(data, IMG):
+                self.bytes += len(data)
+        return data
+
+    # return statistics about the source
+    def stats(self : AssetSource) -> dict[str, int]:
+        return {
+            'hits':self.hits,
+            'misses':self.misses,
+            'bytes':self.bytes,
+            'probes':self.probes
+        }
+
+# decoded images kept in memory
+class MemorySource(AssetSource):
+    name : str = "memory"
+    remote : bool|None = None
+
+    def __init__(self : MemorySource, cache : MemoryCache) -> None:
+        super().__init__()
+        self.cache : MemoryCache = cache
+
+    async def fetch(self : MemorySource, path : str) -> IMG|None:
+        return self.count(self.cache.lookup(path))
+
+    async def exists(self : MemorySource, path : str) -> bool|None:
+        self.probes += 1
+        return True if path in self.cache else None
+
+    async def store(self : MemorySource, path : str, data : bytes|memoryview, img : IMG, origin : AssetSource) -> None:
+        self.cache.set(path, img, pin=(origin.remote is False)) # keep our own UI assets in memory
+
+# assets of a memory mapped pack, for CDN paths or for our local assets
+class PackSource(AssetSource):
+    name : str = "pack"
+
+    def __init__(self : PackSource, pack : AssetPack, remote : bool) -> None:
+        super().__init__()
+        self.pack : AssetPack = pack
+        self.remote = remote
+        self.prefix : str = "" if remote else AssetPack.LOCAL_PREFIX
+
+    async def fetch(self : PackSource, path : str) -> memoryview|None:
+        return self.count(self.pack.lookup(self.prefix + path))
+
+    async def exists(self : PackSource, path : str) -> bool|None:
+        self.probes += 1
+        return True if (self.prefix + path) in self.pack else None
+
+# files previously downloaded from the CDN
+class DiskCacheSource(AssetSource):
+    name : str = "disk"
+
+    def __init__(self : DiskCacheSource, disk_cache : DiskCache) -> None:
+        super().__init__()
+        self.disk_cache : DiskCache = disk_cache
+
+    async def fetch(self : DiskCacheSource, path : str) -> bytes|None:
+        return self.count(await self.run(self.disk_cache.lookup, path))
+
+    async def exists(self : DiskCacheSource, path : str) -> bool|None:
+        self.probes += 1
+        return True if await self.run(self.disk_cache.contains, path) else None # the index may be loaded on first use
+
+    async def store(self : DiskCacheSource, path : str, data : bytes|memoryview, img : IMG, origin : AssetSource) -> None:
+        url : str|None = origin.url(path)
+        if url is None: # only keep downloaded files
+            return
+        try:
+            await self.run(self.disk_cache.insert, path, data, url)
+        except Exception as e:
+            print("Failed to write", path, "in the disk cache:", e)
+
+# a folder mirroring the CDN paths (for example, recorded with localcdn.py)
+class MirrorSource(AssetSource):
+    name : str = "mirror"
+
+    def __init__(self : MirrorSource, folder : str) -> None:
+        super().__init__()
+        self.folder : str = folder
+
+    def file_path(self : MirrorSource, path : str) -> str:
+        return os.path.join(self.folder, *path.split('/'))
+
+    def read(self : MirrorSource, path : str) -> bytes|None:
+        try:
+            with open(self.file_path(path), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    async def fetch(self : MirrorSource, path : str) -> bytes|None:
+        return self.count(await self.run(self.read, path))
+
+    async def exists(self : MirrorSource, path : str) -> bool|None:
+        self.probes += 1
+        return True if await self.run(os.path.isfile, self.file_path(path)) else None
+
+# a ZIP archive of CDN paths
+class ArchiveSource(AssetSource):
+    name : str = "archive"
+
+    def __init__(self : ArchiveSource, filename : str) -> None:
+        super().__init__()
+        self.archive : zipfile.ZipFile = zipfile.ZipFile(filename, mode="r")
+        self.names : set[str] = set(self.archive.namelist())
+
+    async def fetch(self : ArchiveSource, path : str) -> bytes|None:
+        if path not in self.names:
+            return self.count(None)
+        return self.count(await self.run(self.archive.read, path))
+
+    async def exists(self : ArchiveSource, path : str) -> bool|None:
+        self.probes += 1
+        return True if path in self.names else None
+
+# our own assets, relative to the current directory
+class LocalSource(AssetSource):
+    name : str = "local"
+    remote : bool|None = False
+
+    def read(self : LocalSource, path : str) -> bytes:
+        with open(path, "rb") as f: # a missing local asset is an error
+            return f.read()
+
+    async def fetch(self : LocalSource, path : str) -> bytes|None:
+        return self.count(await self.run(self.read, path))
+
+    async def exists(self : LocalSource, path : str) -> bool|None:
+        self.probes += 1
+        return await self.run(os.path.isfile, path)
+
+# the GBF CDN (or the endpoint set in the settings)
+class CDNSource(AssetSource):
+    name : str = "network"
+
+    def __init__(self : CDNSource, owner : GBFPIB) -> None:
+        super().__init__()
+        self.owner : GBFPIB = owner # for its HTTP client, endpoint and settings
+        self.requests : int = 0
+        self.retries : int = 0
+        self.server_errors : int = 0
+        self.timeouts : int = 0
+        self.connection_errors : int = 0
+        self.failures : int = 0 # requests which failed after all their retries
+        self.active : int = 0
+        self.peak : int = 0 # maximum number of requests at once
+
+    def url(self : CDNSource, path : str) -> str|None:
+        return self.owner.get_endpoint() + path
+
+    # send a request, retrying server errors and timeouts with a jittered exponential backoff
+    # return the status and, for a successful GET, the content
+    async def request(self : CDNSource, method : str, url : str) -> tuple[int, bytes|None]:
+        retries : int = self.owner.settings.get('retries', self.owner.RETRIES)
+        timeout : aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=self.owner.settings.get('request_timeout', self.owner.REQUEST_TIMEOUT))
+        attempt : int = 0
+        while True:
+            self.requests += 1
+            self.active += 1
+            self.peak = max(self.peak, self.active)
+            try:
+                async with self.owner.client.request(method, url, timeout=timeout, headers={'connection':'keep-alive'}) as response:
+                    if response.status < 500:
+                        return response.status, (await response.read() if method == "GET" and response.status == 200 else None)
+                    self.server_errors += 1
+                    if attempt >= retries:
+                        self.failures += 1
+                        return response.status, None
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                if attempt >= retries:
+                    self.failures += 1
+                    raise
+            except aiohttp.ClientConnectionError:
+                self.connection_errors += 1
+                if attempt >= retries:
+                    self.failures += 1
+                    raise
+            finally:
+                self.active -= 1
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, self.owner.RETRY_DELAY * 2 ** attempt))
+
+    async def fetch(self : CDNSource, path : str) -> bytes|None:
+        print("[GET] *Downloading File", path)
+        url : str = self.url(path)
+        status, data = await self.request("GET", url)
+        if status == 404:
+            return self.count(None)
+        if status != 200:
+            self.misses += 1
+            raise Exception("HTTP Error code {} for url: {}".format(status, url))
+        return self.count(data)
+
+    async def exists(self : CDNSource, path : str) -> bool|None:
+        self.probes += 1
+        status, data = await self.request("HEAD", self.url(path))
+        match status:
+            case 200:
+                return True
+            case 404:
+                return False
+            case _: # unknown, not remembered
+                return None
+
+    def stats(self : CDNSource) -> dict[str, int]:
+        return super().stats() | {
+            'requests':self.requests,
+            'retries':self.retries,
+            'server_errors':self.server_errors,
+            'timeouts':self.timeouts,
+            'connection_errors':self.connection_errors,
+            'failures':self.failures,
+            'peak_requests':self.peak
+        }
+
+# collect the timings of a render, for the run report
+# sections are timed from start to end (including the waits), primitives only while they run
+class Profiler():
+    # fetches from those tiers are only counted, not listed one by one
+    SILENT_TIERS : tuple[str, ...] = ("memory", "pending")
+
+    def __init__(self : Profiler) -> None:
+        self.lock : threading.Lock = threading.Lock() # the final images are saved in threads
+        self.reset()
+
+    # trace must be True to record the trace events
+    def reset(self : Profiler, trace : bool = False) -> None:
+        self.start : float = time.perf_counter()
+        self.sections : dict[str, dict[str, int|float]] = {}
+        self.primitives : dict[str, dict[str, int|float]] = {}
+        self.outputs : dict[str, dict[str, int|float]] = {}
+        self.tiers : dict[str, dict[str, int|float]] = {}
+        self.fetches : list[dict[str, Any]] = []
+        self.trace : list[dict[str, Any]]|None = [] if trace else None
+        self.tracks : dict[str, int] = {} # track name and id
+
+    # name of the track of the caller: its task name if it runs in the event loop, else its thread name
+    def current_track(self : Profiler) -> str:
+        try:
+            task : asyncio.Task|None = asyncio.current_task()
+        except RuntimeError: # no event loop in this thread
+            task = None
+        if task is not None:
+            return task.get_name()
+        return threading.current_thread().name
+
+    # add a trace event, times are perf_counter() values
+    # a complete event is added if track is set, else an async event (displayed on its own track)
+    def trace_event(self : Profiler, name : str, category : str, start : float, end : float, track : str|None, args : dict|None = None) -> None:
+        if self.trace is None:
+            return
+        with self.lock:
+            ts : float = (start - self.start) * 1000000 # in microseconds
+            if track is not None:
+                if track not in self.tracks:
+                    self.tracks[track] = len(self.tracks) + 1
+                    self.trace.append({'name':'thread_name', 'ph':'M', 'pid':1, 'tid':self.tracks[track], 'args':{'name':track}})
+                event : dict[str, Any] = {'name':name, 'cat':category, 'ph':'X', 'pid':1, 'tid':self.tracks[track], 'ts':ts, 'dur':(end - start) * 1000000}
+                if args is not None:
+                    event['args'] = args
+                self.trace.append(event)
+            else:
+                uid : int = len(self.trace)
+                self.trace.append({'name':name, 'cat':category, 'ph':'b', 'pid':1, 'id':uid, 'ts':ts, 'args':args or {}})
+                self.trace.append({'name':name, 'cat':category, 'ph':'e', 'pid':1, 'id':uid, 'ts':(end - self.start) * 1000000})
+
+    # add a call to the given group, with optional counters (bytes...)
+    def add(self : Profiler, group : dict[str, dict[str, int|float]], name : str, elapsed : float, **counters : int) -> None:
+        with self.lock:
+            if name not in group:
+                group[name] = {'calls':0, 'time':0.0}
+            group[name]['calls'] += 1
+            group[name]['time'] += elapsed
+            for k, v in counters.items():
+                group[name][k] = group[name].get(k, 0) + v
+
+    # time a primitive (resize, paste, text...)
+    @contextmanager
+    def measure(self : Profiler, name : str) -> Generator[None, None, None]:
+        start : float = time.perf_counter()
+        try:
+            yield
+        finally:
+            end : float = time.perf_counter()
+            self.add(self.primitives, name, end - start)
+            self.trace_event(name, "primitive", start, end, self.current_track())
+
+    # time the work done for an output image (party, skin, emp, artifact): drawing its layers, merging and saving them
+    @contextmanager
+    def output(self : Profiler, name : str) -> Generator[None, None, None]:
+        start : float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(self.outputs, name, time.perf_counter() - start)
+
+    # time a section coroutine (make_party, make_emp...)
+    # it must be the coroutine of a task, which is renamed after the section
+    async def timed(self : Profiler, name : str, coro : Coroutine) -> Any:
+        asyncio.current_task().set_name(name)
+        start : float = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            end : float = time.perf_counter()
+            self.add(self.sections, name, end - start)
+            self.trace_event(name, "section", start, end, name)
+
+    # record an asset retrieval and the tier it came from (memory, pending, disk, local or network)
+    def fetch(self : Profiler, path : str, tier : str, elapsed : float, size : int) -> None:
+        self.add(self.tiers, tier, elapsed, bytes=size)
+        if tier not in self.SILENT_TIERS:
+            with self.lock:
+                self.fetches.append({'path':path, 'tier':tier, 'time':elapsed, 'bytes':size})
+            end : float = time.perf_counter()
+            self.trace_event(path.split('/')[-1], "get", end - elapsed, end, None, {'path':path, 'tier':tier, 'bytes':size, 'task':self.current_track()})
+
+    # return the trace events in the Chrome trace format (it can be opened with Perfetto or chrome://tracing)
+    def chrome_trace(self : Profiler) -> dict[str, Any]:
+        return {'traceEvents':self.trace or [], 'displayTimeUnit':'ms'}
+
+    # return the report as a dict, extra being added to it
+    def report(self : Profiler, extra : dict[str, Any]) -> dict[str, Any]:
+        data : dict[str, Any] = extra.copy()
+        data['total'] = time.perf_counter() - self.start
+        data['sections'] = self.sections
+        data['primitives'] = self.primitives
+        data['outputs'] = self.outputs
+        data['tiers'] = self.tiers
+        data['fetches'] = sorted(self.fetches, key=lambda f: f['time'], reverse=True)
+        return data
+
+# parse a size argument such as 500M or 2G
+def size_argument(value : str) -> int:
+    units : dict[str, int] = {'K':1024, 'M':1024**2, 'G':1024**3, 'T':1024**4}
+    try:
+        value = value.strip().upper().removesuffix('B')
+        if value[-1:] in units:
+            return int(float(value[:-1]) * units[value[-1]])
+        return int(value)
+    except:
+        raise argparse.ArgumentTypeError("invalid size: '{}'".format(value))
+
 # General enum
 class PartyMode(IntEnum):
     normal = 0 # normal parties
@@ -618,6 +1566,8 @@ class LayoutArtifactSuperCompact(LayoutArtifactCompact):
 
 dataclass(slots=True)
 class GBFPIBLayout():
+    scale : float
+    canvas_size : v2
     mode : PartyMode
     party : LayoutPartyBase
     summon : LayoutSummon
@@ -626,7 +1576,11 @@ class GBFPIBLayout():
     emp : LayoutEMPBase|None
     artifact : LayoutEMPBase|None
 
-    def __init__(self : GBFPIBLayout, mode : PartyMode, extra : bool, modifier_count : int) -> None:
+    # NOTE: positions and sizes of the layout classes are in the 4k (IMAGE_SIZE) space
+    # scale is the ratio between the output image and this space
+    def __init__(self : GBFPIBLayout, mode : PartyMode, extra : bool, modifier_count : int, scale : float = 1) -> None:
+        self.scale = scale
+        self.canvas_size = IMAGE_SIZE * scale
         self.mode = mode
         match self.mode:
             case PartyMode.normal:
@@ -678,6 +1632,30 @@ class GBFPIBLayout():
         else:
             self.artifact = LayoutArtifactStandard()
 
+    # convert a position from the layout space to the image space
+    def scale_position(self : GBFPIBLayout, position : v2|tuple[int, int]) -> tuple[int, int]:
+        if self.scale == 1:
+            return (int(position[0]), int(position[1]))
+        return (round(position[0] * self.scale), round(position[1] * self.scale))
+
+    # convert a size, placed at the given position, from the layout space to the image space
+    # it's calculated from the scaled corners, so adjacent elements stay adjacent
+    def scale_size(self : GBFPIBLayout, position : v2|tuple[int, int], size : v2|tuple[int, int]) -> tuple[int, int]:
+        if self.scale == 1:
+            return (int(size[0]), int(size[1]))
+        scaled : list[int] = [0, 0]
+        for i in range(2):
+            scaled[i] = round((position[i] + size[i]) * self.scale) - round(position[i] * self.scale)
+            if size[i] > 0:
+                scaled[i] = max(1, scaled[i])
+        return (scaled[0], scaled[1])
+
+    # convert a length (stroke width...) from the layout space to the image space
+    def scale_length(self : GBFPIBLayout, length : int) -> int:
+        if self.scale == 1:
+            return length
+        return max(1, round(length * self.scale))
+
 # Main class
 class GBFPIB():
     VERSION = "12.11"
@@ -742,6 +1720,54 @@ class GBFPIB():
     DESTRUCTION_IDS = {
         "1040028900","1040122300","1040220300","1040621200","1040714700","1040817900"
     }
+    # EMP awakening icons, per type (Balanced uses a local asset)
+    AWAKENING_ICONS = {
+        "Attack":"assets_en/img/sp/assets/item/npcarousal/s/1.jpg",
+        "攻撃":"assets_en/img/sp/assets/item/npcarousal/s/1.jpg",
+        "Defense":"assets_en/img/sp/assets/item/npcarousal/s/2.jpg",
+        "防御":"assets_en/img/sp/assets/item/npcarousal/s/2.jpg",
+        "Multiattack":"assets_en/img/sp/assets/item/npcarousal/s/3.jpg",
+        "連続攻撃":"assets_en/img/sp/assets/item/npcarousal/s/3.jpg"
+    }
+    # EMP domain and other extra upgrade icons
+    EMP_EXTRA_ICONS = {
+        "domain":"assets_en/img/sp/ui/icon/ability/m/1426_3.png",
+        "extra":"assets_en/img/sp/ui/icon/ability/m/2487_3.png",
+        "saint":"assets_en/img/sp/ui/icon/skill/skill_job_weapon.png"
+    }
+    # Default size of the image memory cache, in bytes
+    MEMORY_CACHE_SIZE = 512 * 1024 * 1024
+    # Default size of the cropped/resized image memory cache, in bytes
+    VARIANT_CACHE_SIZE = 256 * 1024 * 1024
+    # Default size of the section layer memory cache, in bytes
+    SECTION_CACHE_SIZE = 512 * 1024 * 1024
+    # Export fields read by each section, used for the section cache keys
+    SECTION_FIELDS = {
+        'party':('p', 'pcjs', 'cml', 'cbl', 'pce', 'c', 'cn', 'cl', 'cs', 'cp', 'cwr', 'ce', 'cst', 'ci', 'cb', 'ps', 'cpl', 'fpl'),
+        'summon':('s', 'ss', 'se', 'sl', 'sp', 'ssm', 'qs', 'satk', 'shp'),
+        'weapon':('p', 'w', 'wl', 'wp', 'wsm', 'wsn', 'wkey', 'waxt', 'waxi', 'wax', 'wakn', 'watk', 'whp', 'est', 'estx', 'sps', 'spsid'),
+        'modifier':('mods',)
+    }
+    # Log tag of each section
+    SECTION_TAGS = {'party':'CHA', 'summon':'SUM', 'weapon':'WPN', 'modifier':'MOD'}
+    # Output image of each layer of the sections
+    SECTION_OUTPUTS = {'party':('party', 'skin'), 'summon':('party', 'skin'), 'weapon':('party', 'skin'), 'modifier':('party',), 'emp':('emp',), 'artifact':('artifact',)}
+    # Maximum number of concurrent downloads during the prefetch
+    PREFETCH_LIMIT = 16
+    # Maximum number of open connections, in total and per host
+    POOL_LIMIT = 32
+    POOL_HOST_LIMIT = 16
+    # Time to keep the DNS results (in seconds)
+    DNS_TTL = 600
+    # Timeout of a single download attempt (in seconds)
+    REQUEST_TIMEOUT = 10
+    # Number of retries after a server error or a timeout, and base delay of the exponential backoff (in seconds)
+    RETRIES = 3
+    RETRY_DELAY = 0.25
+    # Number of threads reading, writing and decoding files
+    IO_THREADS = 8
+    # Delay between two checks of the clipboard or folder, in watch mode (in seconds)
+    WATCH_INTERVAL = 1.0
     # User Agent (required for the wiki)
     USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/135.0.0.0 Safari/537.36 Rosetta/GBFPIB'
     
@@ -752,25 +1778,65 @@ class GBFPIB():
         self.classes : dict[str, str] = None # cached classes
         self.class_modified : bool = False
         self.prev_lang : str = None # Language used in the previous run
+        self.prev_scale : float = None # Image scale used in the previous run
         self.extra_grid : bool = False # True if the data contains more than 10 weapons
-        self.pending : set[str] = set() # pending downloads
-        self.cache : dict[str, IMG] = {} # memory cache
-        self.emp_cache : dict[str, dict] = {} # emp cache
-        self.artifact_cache : dict[str, dict] = {} # artifact cache
+        self.pending : dict[str, asyncio.Future] = {} # pending downloads
+        self.coalesced : int = 0 # number of requests which waited on a pending download
+        self.cache : MemoryCache = MemoryCache(self.MEMORY_CACHE_SIZE) # memory cache
+        self.variant_cache : MemoryCache = MemoryCache(self.VARIANT_CACHE_SIZE) # cropped/resized image cache
+        self.section_cache : MemoryCache = MemoryCache(self.SECTION_CACHE_SIZE) # layers of the party, summon, weapon and modifier sections
+        self.emp_cache : MemoryCache = MemoryCache(80, lambda data: 1) # emp cache, limited to 80 files
+        self.artifact_cache : MemoryCache = MemoryCache(80, lambda data: 1) # artifact cache, limited to 80 files
         self.sumcache : dict[str, str] = {} # wiki summon cache
+        self.disk_cache : DiskCache = DiskCache("cache") # disk cache
+        self.sources : list[AssetSource]|None = None # asset sources, built on first use
+        self.io_pool : ThreadPoolExecutor = ThreadPoolExecutor(max_workers=self.IO_THREADS, thread_name_prefix="io") # threads are started on first use
         self.fonts : dict[str, ImageFont] = {'mini':None, 'small':None, 'medium':None, 'big':None} # font to use during the processing
+        self.font_lock : threading.Lock = threading.Lock()
+        self.drawers : dict[str, ThreadPoolExecutor] = {} # drawing thread of each section, in parallel drawing mode
+        self.display_lists : dict[str, dict]|None = None # display lists of the last render, if they must be saved
+        self.outputs : set[str] = {'party'} # outputs requested for the current render
         self.quality : float = 1 # quality ratio in use currently
         self.definition : tuple[int, int] = None # image size
         self.running : bool = False # True if the image building is in progress
         self.settings : dict[str, str|int|bool] = {} # settings
-        self.dummy_layer : IMG = self.blank_image() # blank image used during generation
+        self.output_folder : str = "" # folder where the images are saved (empty for the current directory)
+        self.profiler : Profiler = Profiler() # timings of the current render
         self.client : aiohttp.ClientSession = None # HTTP client
 
+    # create another instance sharing our HTTP client, caches and settings
+    # used to run multiple renders at once (each render modifies the instance state)
+    def make_worker(self : GBFPIB) -> GBFPIB:
+        if self.classes is None:
+            self.loadClasses()
+        worker : GBFPIB = GBFPIB()
+        worker.client = self.client
+        worker.classes = self.classes
+        worker.pending = self.pending
+        worker.cache = self.cache
+        worker.variant_cache = self.variant_cache
+        worker.section_cache = self.section_cache
+        worker.emp_cache = self.emp_cache
+        worker.artifact_cache = self.artifact_cache
+        worker.sumcache = self.sumcache
+        worker.disk_cache = self.disk_cache
+        worker.io_pool = self.io_pool
+        worker.sources = self.get_sources()
+        worker.settings = self.settings.copy()
+        return worker
+
     # init the HTTP client
     @asynccontextmanager
     async def init_client(self : GBFPIB) -> Generator[aiohttp.ClientSession, None, None]:
         try:
-            self.client = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+            self.client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.settings.get('pool_limit', self.POOL_LIMIT),
+                    limit_per_host=self.settings.get('pool_host_limit', self.POOL_HOST_LIMIT),
+                    ttl_dns_cache=self.DNS_TTL
+                ),
+                timeout=aiohttp.ClientTimeout(total=20)
+            )
             yield self.client
         finally:
             await self.client.close()
@@ -797,94 +1863,358 @@ class GBFPIB():
         except:
             pass
 
+    # pack the disk cache and our local assets in one file
+    def makePack(self : GBFPIB, filename : str) -> None:
+        files : list[tuple[str, str]] = []
+        if os.path.isdir(self.disk_cache.folder):
+            self.disk_cache.load()
+            for key, entry in self.disk_cache.index.items():
+                if '|' not in entry['path'] and os.path.isfile(self.disk_cache.file_path(key)): # skip the resized assets and section layers
+                    files.append((entry['path'], self.disk_cache.file_path(key)))
+        for root, dirs, filenames in os.walk("assets"):
+            for name in filenames:
+                if name.endswith((".png", ".jpg")):
+                    path : str = os.path.join(root, name).replace('\\', '/')
+                    files.append((AssetPack.LOCAL_PREFIX + path, path))
+        count, size = AssetPack.build(filename, files)
+        print("{} file(s) packed in {}, {:.1f} MB".format(count, filename, size / 1048576))
+
+    # run a blocking call (file access, JSON parsing, image decoding...) in the I/O thread pool
+    async def run_io(self : GBFPIB, func : Callable, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.io_pool, func, *args)
+
+    # decode an image file
+    def decode(self : GBFPIB, data : bytes|memoryview) -> IMG:
+        with self.profiler.measure("decode"):
+            return IMG(data)
+
+    # read and parse a JSON file
+    def read_json(self : GBFPIB, path : str) -> Any:
+        with open(path, mode="r", encoding="utf-8") as f:
+            return json.load(f)
+
+    # build the list of asset sources, in lookup order
+    def get_sources(self : GBFPIB) -> list[AssetSource]:
+        if self.sources is None:
+            self.sources = [MemorySource(self.cache)]
+            for filename in self.settings.get('pack', None) or []:
+                try:
+                    pack : AssetPack = AssetPack(filename)
+                    self.sources.append(PackSource(pack, True))
+                    self.sources.append(PackSource(pack, False))
+                except Exception as e:
+                    print("Couldn't open the asset pack", filename, ":", e)
+            if self.settings.get('caching', False):
+                self.sources.append(DiskCacheSource(self.disk_cache))
+            for folder in self.settings.get('mirror', None) or []:
+                self.sources.append(MirrorSource(folder))
+            for filename in self.settings.get('archive', None) or []:
+                try:
+                    self.sources.append(ArchiveSource(filename))
+                except Exception as e:
+                    print("Couldn't open the archive", filename, ":", e)
+            self.sources.append(LocalSource())
+            self.sources.append(CDNSource(self))
+            for source in self.sources:
+                source.pool = self.io_pool
+        return self.sources
+
     # retrieve an image from the given path/url
-    async def get(self : GBFPIB, path : str, remote : bool = True, forceDownload : bool = False) -> bytes:
+    async def get(self : GBFPIB, path : str, remote : bool = True, forceDownload : bool = False) -> IMG:
+        start : float = time.perf_counter()
         # check language
         if self.japanese:
             path = path.replace('assets_en', 'assets')
         # check if retrieval is pending
+        # if so, we wait for the owner of the download to be done
+        # if the owner was cancelled, we try again (and may become the owner), only the cancelled task fails
         while path in self.pending:
-            await asyncio.sleep(0.005)
-        self.pending.add(path)
+            self.coalesced += 1
+            pending : asyncio.Future = self.pending[path]
+            try:
+                img : IMG = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if pending.cancelled() and asyncio.current_task().cancelling() == 0:
+                    continue
+                raise
+            self.profiler.fetch(path, "pending", time.perf_counter() - start, 0)
+            return img
+        if remote and self.disk_cache.missing.lookup(path):
+            raise Exception("Asset not found (known as missing): " + path)
+        future : asyncio.Future = asyncio.get_running_loop().create_future()
+        self.pending[path] = future
         try:
-            # retrieve
-            if forceDownload or path not in self.cache:
-                try: # get from disk cache if enabled
-                    if forceDownload:
-                        raise Exception() # go to exception/download block
-                    if self.settings.get('caching', False):
-                        with open("cache/" + b64encode(path.encode('utf-8')).decode('utf-8'), "rb") as f:
-                            self.cache[path] = IMG(f.read())
-                        await asyncio.sleep(0)
-                    else:
-                        raise Exception()
-                except: # else request it from gbf
-                    if remote:
-                        print("[GET] *Downloading File", path)
-                        response : aiohttp.Response = await self.client.get('https://' + self.settings.get('endpoint', 'prd-game-a-granbluefantasy.akamaized.net/') + path, headers={'connection':'keep-alive'})
-                        async with response:
-                            if response.status != 200:
-                                raise Exception("HTTP Error code {} for url: {}".format(response.status, 'https://' + self.settings.get('endpoint', 'prd-game-a-granbluefantasy.akamaized.net/') + path))
-                            io : bytes = await response.read()
-                            self.cache[path] = IMG(io)
-                            if self.settings.get('caching', False):
-                                try:
-                                    with open("cache/" + b64encode(path.encode('utf-8')).decode('utf-8'), "wb") as f:
-                                        f.write(io)
-                                    await asyncio.sleep(0)
-                                except Exception as e:
-                                    print(self.pexc(e))
-                                    pass
-                    else:
-                        with open(path, "rb") as f:
-                            self.cache[path] = IMG(f.read())
-                        await asyncio.sleep(0)
-            # end
-            self.pending.remove(path)
-            return self.cache[path]
+            sources : list[AssetSource] = self.get_sources()
+            for i, source in enumerate(sources):
+                if not source.serves(remote) or (forceDownload and not isinstance(source, CDNSource)):
+                    continue
+                data : bytes|memoryview|IMG|None = await source.fetch(path)
+                if data is None:
+                    continue
+                if isinstance(data, IMG):
+                    img = data
+                    size : int = 0
+                else:
+                    img = await self.run_io(self.decode, data)
+                    size = len(data)
+                    # let the previous sources keep a copy
+                    for previous in sources[:i]:
+                        if previous.serves(remote):
+                            await previous.store(path, data, img, source)
+                self.profiler.fetch(path, source.name, time.perf_counter() - start, size)
+                future.set_result(img)
+                return img
+            if remote:
+                self.disk_cache.missing.add(path)
+            raise Exception("Asset not found: " + path)
         except Exception as ex:
-            self.pending.remove(path) # failsafe
+            # forward the error to the waiters
+            future.set_exception(ex)
+            future.exception() # mark as retrieved, to avoid asyncio warnings if nobody is waiting
             raise ex
+        finally:
+            if not future.done(): # the owner was cancelled, the waiters will retry
+                future.cancel()
+            self.pending.pop(path, None)
 
-    # paste an image onto our list of images for given range
-    async def paste(self : GBFPIB, imgs : list[IMG], indexes : range, file : str|IMG, offset : tuple[int, int], *, resize : tuple[int, int]|None = None, transparency : bool = False, crop : tuple[int, int]|tuple[int, int, int, int]|None = None) -> list[IMG]:
+    # check if a CDN asset exists, the first source knowing the answer is used
+    async def exists(self : GBFPIB, path : str) -> bool:
+        if self.disk_cache.missing.lookup(path):
+            return False
+        for source in self.get_sources():
+            if source.serves(True):
+                r : bool|None = await source.exists(path)
+                if r is not None:
+                    if not r:
+                        self.disk_cache.missing.add(path)
+                    return r
+        return False
+
+    # return the connection pool settings and the download statistics
+    def pool_stats(self : GBFPIB) -> dict[str, Any]:
+        data : dict[str, Any] = {
+            'limit':self.client.connector.limit,
+            'limit_per_host':self.client.connector.limit_per_host,
+            'dns_ttl':self.DNS_TTL,
+            'request_timeout':self.settings.get('request_timeout', self.REQUEST_TIMEOUT),
+            'retries':self.settings.get('retries', self.RETRIES)
+        }
+        for source in self.get_sources():
+            if isinstance(source, CDNSource):
+                data['stats'] = source.stats()
+        return data
+
+    # return the url of the CDN endpoint, https is used if no scheme is set
+    def get_endpoint(self : GBFPIB) -> str:
+        endpoint : str = self.settings.get('endpoint', 'prd-game-a-granbluefantasy.akamaized.net/')
+        if not endpoint.startswith(('http://', 'https://')):
+            endpoint = 'https://' + endpoint
+        return endpoint
+
+    # add the paste of an image to a display list, on the layers of the given range
+    async def paste(self : GBFPIB, imgs : DisplayList, indexes : range, file : str|IMG, offset : tuple[int, int], *, resize : tuple[int, int]|None = None, transparency : bool = False, crop : tuple[int, int]|tuple[int, int, int, int]|None = None, remote : bool = False) -> DisplayList:
+        layers : tuple[int, ...] = imgs.targets(indexes)
+        if len(layers) == 0: # only for outputs which aren't requested
+            return imgs
+        # convert to the image space (crop is in the file space and isn't affected)
+        if resize is not None:
+            resize = self.layout.scale_size(offset, resize)
+        offset = self.layout.scale_position(offset)
         # get file
+        source : str|None = None
         if isinstance(file, str):
-            if self.japanese:
+            if self.japanese and not remote:
                 file = file.replace('_EN', '')
-            file = await self.get(file, remote=False)
-        # crop
-        if crop is not None:
-            file = file.crop(crop)
-        # resize
-        if resize is not None:
-            file = file.resize(resize)
-        # paste
-        if not transparency:
-            for i in indexes:
-                imgs[i].paste(file, offset)
-        else:
-            layer = self.dummy_layer.copy()
-            layer.paste(file, offset)
-            for i in indexes:
-                imgs[i] = imgs[i].alpha(layer)
+            source = file
+            file = await self.get_variant(file, remote, crop, resize)
+        elif crop is not None or resize is not None:
+            file = await self.draw(self.crop_resize, file, crop, resize)
+        # record
+        imgs.add(PasteOp(layers, source, file, tuple(offset), transparency))
         await asyncio.sleep(0)
         # return
         return imgs
 
+    # crop then resize an image
+    def crop_resize(self : GBFPIB, img : IMG, crop : tuple[int, int]|tuple[int, int, int, int]|None, resize : tuple[int, int]|None) -> IMG:
+        with self.profiler.measure("resize"):
+            if crop is not None:
+                img = img.crop(crop)
+            if resize is not None:
+                img = img.resize(resize)
+        return img
+
+    # draw a display list
+    # the base layer is drawn on a full canvas, the overlays are only drawn in the areas they cover
+    def rasterize(self : GBFPIB, name : str, dl : DisplayList) -> list[IMG|SparseLayer]:
+        blended : dict[int, IMG] = {} # blend layer of each transparent image, built once
+        outputs : tuple[str, ...] = self.SECTION_OUTPUTS[name]
+        with self.profiler.output(outputs[0]):
+            imgs : list[IMG|SparseLayer] = [self.blank_image()]
+            self.draw_ops(imgs[0], (0, 0), dl.layer(0), blended)
+        for i in range(1, dl.count):
+            with self.profiler.output(outputs[i]):
+                imgs.append(self.draw_sparse(dl.layer(i), blended))
+        return imgs
+
+    # draw display list operations as a sparse layer
+    # the overlapping areas are merged into patches, and each patch is drawn with the operations covering it
+    def draw_sparse(self : GBFPIB, ops : list[PasteOp|TextOp], blended : dict[int, IMG]) -> SparseLayer:
+        width, height = self.layout.canvas_size.i
+        patches : list[tuple[tuple[int, int, int, int], list[int]]] = [] # area and operation indexes of each patch
+        draw : ImageDraw.ImageDraw = ImageDraw.Draw(Image.new("RGBA", (1, 1)))
+        for i, op in enumerate(ops):
+            if isinstance(op, TextOp):
+                with self.font_lock:
+                    box : tuple[int, int, int, int] = op.box(draw)
+            else:
+                box = op.box()
+            box = (max(0, box[0]), max(0, box[1]), min(width, box[2]), min(height, box[3]))
+            if box[0] >= box[2] or box[1] >= box[3]:
+                continue # off canvas
+            indexes : list[int] = [i]
+            merged : bool = True
+            while merged: # merge with the patches it overlaps, until there are none left
+                merged = False
+                for j, (area, others) in enumerate(patches):
+                    if box[0] < area[2] and area[0] < box[2] and box[1] < area[3] and area[1] < box[3]:
+                        box = (min(box[0], area[0]), min(box[1], area[1]), max(box[2], area[2]), max(box[3], area[3]))
+                        indexes.extend(others)
+                        patches.pop(j)
+                        merged = True
+                        break
+            patches.append((box, indexes))
+        layer : SparseLayer = SparseLayer()
+        for box, indexes in patches:
+            patch : IMG = IMG(Image.new("RGBA", (box[2] - box[0], box[3] - box[1]), (0, 0, 0, 0)))
+            self.draw_ops(patch, box[:2], [ops[i] for i in sorted(indexes)], blended)
+            layer.add(box[:2], patch)
+        return layer
+
+    # draw display list operations on an image, whose top left corner is at the given origin of the canvas
+    def draw_ops(self : GBFPIB, img : IMG, origin : tuple[int, int], ops : list[PasteOp|TextOp], blended : dict[int, IMG]) -> None:
+        draw : ImageDraw.ImageDraw|None = None
+        for op in ops:
+            if isinstance(op, TextOp):
+                with self.font_lock, self.profiler.measure("text"): # the fonts can't be used by two threads at once
+                    if draw is None:
+                        draw = ImageDraw.Draw(img.image, 'RGBA')
+                    position : tuple = (op.args[0][0] - origin[0], op.args[0][1] - origin[1])
+                    getattr(draw, op.method)(position, *op.args[1:], **op.kwargs)
+                continue
+            offset : tuple[int, int] = (op.offset[0] - origin[0], op.offset[1] - origin[1])
+            if not op.blend:
+                with self.profiler.measure("paste"):
+                    img.paste(op.image, offset)
+            else:
+                with self.profiler.measure("alpha_composite"):
+                    # equivalent to pasting on a blank layer the size of the image, then compositing the whole layer
+                    layer : IMG|None = blended.get(id(op.image))
+                    if layer is None:
+                        layer = IMG(Image.new("RGBA", op.image.image.size, (0, 0, 0, 0)))
+                        layer.paste(op.image, (0, 0))
+                        blended[id(op.image)] = layer
+                    img.alpha_at(layer, offset)
+
+    # return the name of the section being drawn by the current task, if parallel drawing is enabled
+    # each section has its own drawing thread, where its calls run one after the other
+    def current_drawer(self : GBFPIB) -> str|None:
+        if not self.settings.get('parallel', False):
+            return None
+        try:
+            task : asyncio.Task|None = asyncio.current_task()
+        except RuntimeError: # no event loop in this thread
+            return None
+        if task is None or not task.get_name().startswith("make_"):
+            return None
+        name : str = task.get_name()
+        if name not in self.drawers:
+            self.drawers[name] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        return name
+
+    # run a drawing call and wait for its result
+    async def draw(self : GBFPIB, func : Callable, *args) -> Any:
+        name : str|None = self.current_drawer()
+        if name is None:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.drawers[name], func, *args)
+
+    # run a make_* coroutine, then draw its display list
+    async def drawn(self : GBFPIB, coro : Coroutine) -> str|tuple[str, list[IMG|SparseLayer]]:
+        r : str|tuple[str, DisplayList] = await coro
+        if isinstance(r, tuple):
+            try:
+                if self.display_lists is not None:
+                    self.display_lists[r[0]] = r[1].to_json()
+                r = (r[0], await self.draw(self.rasterize, r[0], r[1]))
+            except Exception as e:
+                return self.pexc(e) # like the make_* functions
+        return r
+
     # download and paste an image onto our list of images for given range
-    async def pasteDL(self : GBFPIB, imgs : list[IMG], indexes : range, path : str, offset : tuple[int, int], *, resize : tuple[int, int]|None = None, transparency : bool = False, crop : tuple[int, int]|tuple[int, int, int, int]|None = None) -> list: # dl an image and call pasteImage()
-        return await self.paste(imgs, indexes, await self.get(path), offset, resize=resize, transparency=transparency, crop=crop)
+    async def pasteDL(self : GBFPIB, imgs : DisplayList, indexes : range, path : str, offset : tuple[int, int], *, resize : tuple[int, int]|None = None, transparency : bool = False, crop : tuple[int, int]|tuple[int, int, int, int]|None = None) -> DisplayList: # dl an image and call pasteImage()
+        return await self.paste(imgs, indexes, path, offset, resize=resize, transparency=transparency, crop=crop, remote=True)
+
+    # retrieve an image, cropped then resized
+    # the result is kept in the variant cache (and on disk if enabled), so identical pastes reuse the same pixels
+    async def get_variant(self : GBFPIB, path : str, remote : bool, crop : tuple[int, int]|tuple[int, int, int, int]|None, resize : v2|tuple[int, int]|None) -> IMG:
+        if crop is None and resize is None:
+            return await self.get(path, remote=remote)
+        if self.japanese:
+            path = path.replace('assets_en', 'assets') # same as get()
+        if isinstance(resize, v2):
+            resize = resize.i
+        key : str = "{}|{}|{}|LANCZOS".format(path, None if crop is None else tuple(crop), None if resize is None else tuple(resize))
+        img : IMG|None = self.variant_cache.lookup(key)
+        if img is not None:
+            return img
+        to_disk : bool = self.settings.get('caching', False) and self.settings.get('variant_disk', False)
+        if to_disk:
+            img = await self.run_io(self.load_variant, key)
+            if img is not None:
+                self.variant_cache.set(key, img)
+                return img
+        img = await self.draw(self.crop_resize, await self.get(path, remote=remote), crop, resize)
+        self.variant_cache.set(key, img)
+        if to_disk:
+            try:
+                await self.run_io(self.save_variant, key, img)
+            except Exception as e:
+                print(self.pexc(e))
+        return img
+
+    # load a resized asset from the disk cache, None if not found
+    def load_variant(self : GBFPIB, key : str) -> IMG|None:
+        data : bytes|None = self.disk_cache.lookup(key)
+        if data is None:
+            return None
+        return self.decode(data)
+
+    # save a resized asset in the disk cache
+    def save_variant(self : GBFPIB, key : str, img : IMG) -> None:
+        with BytesIO() as buffer:
+            img.image.save(buffer, "PNG")
+            self.disk_cache.insert(key, buffer.getvalue(), None)
+
+    # convert text arguments to the image space (the fonts are already scaled)
+    def scale_text_args(self : GBFPIB, args : tuple, kwargs : dict) -> tuple:
+        if 'stroke_width' in kwargs:
+            kwargs['stroke_width'] = self.layout.scale_length(kwargs['stroke_width'])
+        return (self.layout.scale_position(args[0]),) + args[1:]
 
-    # write text on images
-    def text(self : GBFPIB, imgs : list[IMG], indexes : range, *args, **kwargs) -> None:
-        for i in indexes:
-            ImageDraw.Draw(imgs[i].image, 'RGBA').text(*args, **kwargs)
+    # add text to a display list
+    def text(self : GBFPIB, imgs : DisplayList, indexes : range, *args, **kwargs) -> None:
+        layers : tuple[int, ...] = imgs.targets(indexes)
+        if len(layers) > 0:
+            args = self.scale_text_args(args, kwargs)
+            imgs.add(TextOp(layers, "text", args, kwargs))
 
-    # write multiline text on images
-    def multiline_text(self : GBFPIB, imgs : list[IMG], indexes : range, *args, **kwargs) -> None:
-        for i in indexes:
-            ImageDraw.Draw(imgs[i].image, 'RGBA').multiline_text(*args, **kwargs)
+    # add multiline text to a display list
+    def multiline_text(self : GBFPIB, imgs : DisplayList, indexes : range, *args, **kwargs) -> None:
+        layers : tuple[int, ...] = imgs.targets(indexes)
+        if len(layers) > 0:
+            args = self.scale_text_args(args, kwargs)
+            imgs.add(TextOp(layers, "multiline_text", args, kwargs))
 
     # search in the gbf.wiki cargo table to match a summon name to its id
     async def get_support_summon_from_wiki(self : GBFPIB, name : str) -> str|None: 
@@ -1060,11 +2390,9 @@ class GBFPIB():
 
     # subroutine of get_mc_job_look
     async def get_mc_job_look_sub(self : GBFPIB, job : str, mh : str) -> str|None:
-        response : aiohttp.Response = await self.client.head("https://prd-game-a-granbluefantasy.akamaized.net/assets_en/img/sp/assets/leader/s/{}_{}_0_01.jpg".format(job, mh))
-        async with response:
-            if response.status != 200:
-                return None
+        if await self.exists("assets_en/img/sp/assets/leader/s/{}_{}_0_01.jpg".format(job, mh)):
             return mh
+        return None
 
     def process_weapon_key(self : GBFPIB, export : dict, i : int, j : int) -> bool:
         sk_name = export['wkey'].get(export['w'][i].split("_")[0], {}).get("sk{}".format(j+1), None)
@@ -1121,16 +2449,258 @@ class GBFPIB():
                         return True
         return False
 
+    # set of the outputs to render, according to the settings
+    # the HP gauge is only drawn on skin.png, so it's only requested with it
+    def requested_outputs(self : GBFPIB) -> set[str]:
+        outputs : set[str] = {'party'}
+        if self.settings.get('skin', True):
+            outputs.add('skin')
+            if self.settings.get('hp', True):
+                outputs.add('hp')
+        if self.settings.get('emp', False):
+            outputs.add('emp')
+        if self.settings.get('artifact', False):
+            outputs.add('artifact')
+        return outputs
+
+    # number of layers of the party, summon and weapon sections: the skin.png one is only drawn if requested
+    def layer_count(self : GBFPIB) -> int:
+        return 2 if 'skin' in self.outputs else 1
+
     def blank_image(self : GBFPIB) -> IMG:
-        i = Image.new('RGB', IMAGE_SIZE.i, "black")
-        im_a = Image.new("L", IMAGE_SIZE.i, "black")
+        i = Image.new('RGB', self.layout.canvas_size.i, "black")
+        im_a = Image.new("L", self.layout.canvas_size.i, "black")
         i.putalpha(im_a)
         im_a.close()
         return IMG(i)
 
-    async def make_party(self : GBFPIB, export : dict) -> str|tuple[str, list[IMG]]:
+    # list the remote assets used by a party export for the requested outputs, following the same rules as the make_* functions
+    # only the given sections are planned (the others are in the section cache), the emp and artifact outputs always are
+    # the layout and the outputs must be set beforehand
+    async def plan_assets(self : GBFPIB, export : dict, sections : set[str]) -> list[str]:
+        paths : dict[str, None] = {} # used as an ordered set
+        skin : bool = 'skin' in self.outputs
+        party : bool = 'party' in sections
+        # party
+        if party: # the class probes are only needed to draw the party
+            class_id : str = await self.get_mc_job_look(export['pcjs'], export['p'])
+            paths["assets_en/img/sp/assets/leader/s/{}.jpg".format(class_id)] = None
+            paths["assets_en/img/sp/ui/icon/job/{}.png".format(export['p'])] = None
+            if export['cbl'] == '6':
+                paths["assets_en/img/sp/ui/icon/job/ico_perfection.png"] = None
+            if skin and class_id != export['pcjs']:
+                paths["assets_en/img/sp/assets/leader/s/{}.jpg".format(export['pcjs'])] = None
+        characters : list[tuple[int, str]] = [] # index and portrait of each ally, also used by emp and artifact
+        for i in range(0, self.layout.party.character_count):
+            if i == 0 and self.layout.party.skip_zero:
+                continue
+            if i >= len(export['c']) or export['c'][i] is None:
+                if party:
+                    paths["assets_en/img/sp/tower/assets/npc/s/3999999999.jpg"] = None
+                continue
+            cid : str = self.get_character_look(export, i)
+            characters.append((i, cid))
+            if party:
+                paths["assets_en/img/sp/assets/npc/s/{}.jpg".format(cid)] = None
+                if skin and cid != export['ci'][i]:
+                    paths["assets_en/img/sp/assets/npc/s/{}.jpg".format(export['ci'][i])] = None
+                if export['cwr'][i] == True:
+                    paths["assets_en/img/sp/ui/icon/augment2/icon_augment2_l.png"] = None
+        if party:
+            if export['cpl'] is not None:
+                paths["assets_en/img/sp/assets/shield/s/{}.jpg".format(export['cpl'])] = None
+            elif export['fpl'] is not None:
+                paths["assets_en/img/sp/assets/familiar/s/{}.jpg".format(export['fpl'])] = None
+        # summons
+        if 'summon' in sections:
+            for i in range(0, 7):
+                if export['s'][i] is None:
+                    paths["assets_en/img/sp/assets/summon/{}/2999999999.jpg".format(self.layout.summon.get_asset_folder(i)[1])] = None
+                    continue
+                paths["assets_en/img/sp/assets/summon/{}/{}.jpg".format(self.layout.summon.get_asset_folder(i)[0], export['ss'][i])] = None
+                if skin and i == 0 and export['ssm'] is not None:
+                    paths["assets_en/img/sp/assets/summon/{}/{}.jpg".format(self.layout.summon.get_asset_folder(i)[0], export['ssm'])] = None
+        # weapons
+        if 'weapon' in sections:
+            for i in range(0, len(export['w'])):
+                wt : str = "ls" if i == 0 else "m"
+                if export['w'][i] is None or export['wl'][i] is None:
+                    if i < 10:
+                        paths["assets_en/img/sp/assets/weapon/{}/1999999999.jpg".format(wt)] = None
+                    continue
+                has_ax : bool = len(export['waxt'][i]) > 0
+                has_awakening : bool = (export['wakn'][i] is not None and export['wakn'][i]['is_arousal_weapon'] and export['wakn'][i]['level'] is not None and export['wakn'][i]['level'] > 1)
+                paths["assets_en/img/sp/assets/weapon/{}/{}.jpg".format(wt, export['w'][i])] = None
+                if skin and i <= 1 and export['wsm'][i] is not None and (i == 0 or export['p'] in self.AUXILIARY_CLS):
+                    paths["assets_en/img/sp/assets/weapon/{}/{}.jpg".format(wt, export['wsm'][i])] = None
+                if i == 0 or not has_ax or not has_awakening:
+                    for j in range(3):
+                        if export['wsn'][i][j] is not None:
+                            if self.process_weapon_key(export, i, j):
+                                paths[export['wsn'][i][j]] = None
+                            else:
+                                paths["assets_en/img/sp/ui/icon/skill/{}.png".format(export['wsn'][i][j])] = None
+                if has_ax:
+                    paths["assets_en/img/sp/ui/icon/augment_skill/{}.png".format(export['waxt'][i][0])] = None
+                    for j in range(len(export['waxi'][i])):
+                        paths["assets_en/img/sp/ui/icon/skill/{}.png".format(export['waxi'][i][j])] = None
+                if has_awakening:
+                    paths["assets_en/img/sp/ui/icon/arousal_type/type_{}.png".format(export['wakn'][i]['form'])] = None
+            if export['spsid'] is not None: # NOTE: summons looked up on the wiki aren't planned
+                paths["assets_en/img/sp/assets/summon/m/{}.jpg".format(export['spsid'])] = None
+        # modifiers
+        if 'modifier' in sections:
+            for m in export['mods']:
+                paths["assets_en/img/sp/ui/icon/weapon_skill_label/" + m['icon_img']] = None
+        # emp
+        if 'emp' in self.outputs:
+            emps : list[tuple[int, str, dict]] = []
+            for i, cid in characters:
+                data : dict|None = await self.loadEMP(cid.split('_')[0])
+                if data is not None:
+                    emps.append((i, cid, data))
+            self.layout.init_emp(len(emps))
+            for i, cid, data in emps:
+                paths["assets_en/img/sp/assets/npc/{}/{}.jpg".format(self.layout.emp.folder, cid)] = None
+                if export['cwr'][i] == True:
+                    paths["assets_en/img/sp/ui/icon/augment2/icon_augment2_l.png"] = None
+                for emp in data['emp']:
+                    if emp.get('is_lock', False):
+                        paths["assets_en/img/sp/zenith/assets/ability/lock.png"] = None
+                    else:
+                        paths["assets_en/img/sp/zenith/assets/ability/{}.png".format(emp['image'])] = None
+                if data.get('awakening', None) is not None and data['awaktype'] in self.AWAKENING_ICONS:
+                    paths[self.AWAKENING_ICONS[data['awaktype']]] = None
+                if not isinstance(self.layout.emp, LayoutEMPSuperCompact):
+                    for key in ['domain', 'saint', 'extra']:
+                        if key in data and len(data[key]) > 0:
+                            paths[self.EMP_EXTRA_ICONS[key]] = None
+        # artifact
+        if 'artifact' in self.outputs:
+            artifacts : list[tuple[str, dict]] = []
+            count : int = 0
+            for i, cid in characters:
+                data : dict|None = await self.loadArtifact(cid.split('_')[0])
+                if data is not None:
+                    count += 1
+                    if "img" in data["artifact"] and "skills" in data["artifact"]:
+                        artifacts.append((cid, data))
+            self.layout.init_artifact(count)
+            for cid, data in artifacts:
+                paths["assets_en/img/sp/assets/npc/{}/{}.jpg".format(self.layout.artifact.folder, cid)] = None
+                if not isinstance(self.layout.artifact, LayoutArtifactSuperCompact):
+                    paths["assets_en/img/sp/assets/artifact/{}/{}".format(self.layout.artifact.folder, data["artifact"]["img"])] = None
+                for skill in data['artifact']['skills']:
+                    paths[skill['icon'] if skill['icon'].startswith('assets') else "assets_en/img/sp/ui/icon/bonus/{}".format(skill['icon'])] = None
+        return list(paths.keys())
+
+    # download the given assets in the memory cache, with a limited number of concurrent downloads
+    # the make_* functions will wait on those downloads via the pending futures of get()
+    async def prefetch(self : GBFPIB, paths : list[str]) -> None:
+        if len(paths) == 0: # every section is cached
+            return
+        semaphore : asyncio.Semaphore = asyncio.Semaphore(self.PREFETCH_LIMIT)
+        async def fetch(path : str) -> None:
+            async with semaphore:
+                await self.get(path)
+        print("[GET] * Prefetching", len(paths), "asset(s)...")
+        results : list = await asyncio.gather(*[asyncio.create_task(fetch(path), name="prefetch") for path in paths], return_exceptions=True)
+        errors : int = sum(1 for r in results if isinstance(r, Exception))
+        if errors > 0:
+            print("[GET] * {} asset(s) failed to prefetch".format(errors))
+
+    # key of the section cache, for the given section
+    # made of the export fields read by the section and of everything else affecting its drawing
+    def section_key(self : GBFPIB, name : str, export : dict) -> str:
+        data : list = [
+            name,
+            self.VERSION,
+            self.layout.scale,
+            self.layout.mode,
+            self.layout.modifier.__class__.__name__,
+            self.extra_grid,
+            self.japanese,
+            sorted(self.outputs & {'skin', 'hp'})
+        ]
+        for field in self.SECTION_FIELDS[name]:
+            data.append(export.get(field, None))
+        return "section|" + hashlib.sha1(json.dumps(data, default=str).encode('utf-8')).hexdigest()
+
+    # look up the layers of a section in the section cache, then in the disk cache if enabled
+    # return the section key (None if it can't be computed) and the layers (None if not cached)
+    async def lookup_section(self : GBFPIB, name : str, export : dict) -> tuple[str|None, list[IMG|SparseLayer]|None]:
+        try:
+            key : str = self.section_key(name, export)
+        except Exception as e:
+            print(self.pexc(e))
+            return (None, None)
+        imgs : list[IMG|SparseLayer]|None = self.section_cache.lookup(key)
+        if imgs is not None:
+            print("[{}] * Reusing the cached {} layers".format(self.SECTION_TAGS[name], name))
+            return (key, imgs)
+        if self.settings.get('caching', False) and self.settings.get('section_disk', False):
+            imgs = await self.run_io(self.load_section, key)
+            if imgs is not None:
+                self.section_cache.set(key, imgs)
+                print("[{}] * Reusing the {} layers from the disk cache".format(self.SECTION_TAGS[name], name))
+        return (key, imgs)
+
+    # call a make_* function, unless its layers were found by lookup_section
+    # layers are also kept in the disk cache if enabled, stacked vertically in a single PNG
+    async def make_section(self : GBFPIB, name : str, maker : Callable, export : dict, key : str|None, imgs : list[IMG|SparseLayer]|None) -> str|tuple[str, list[IMG|SparseLayer]]:
+        if imgs is not None:
+            return (name, list(imgs)) # copy the list, as the layers get replaced during the merge
+        r : str|tuple[str, list[IMG|SparseLayer]] = await self.drawn(maker(export))
+        if isinstance(r, tuple) and key is not None:
+            self.section_cache.set(key, list(r[1]))
+            if self.settings.get('caching', False) and self.settings.get('section_disk', False):
+                try:
+                    await self.run_io(self.save_section, key, r[1])
+                except Exception as e:
+                    print(self.pexc(e))
+        return r
+
+    # load the layers of a section from the disk cache, None if not found
+    def load_section(self : GBFPIB, key : str) -> list[IMG|SparseLayer]|None:
+        data : bytes|None = self.disk_cache.lookup(key)
+        if data is None:
+            return None
+        stack : IMG = self.decode(data)
+        width, height = self.layout.canvas_size.i
+        if stack.image.width != width or stack.image.height < height or 'patches' not in stack.image.info:
+            return None
+        imgs : list[IMG|SparseLayer] = [stack.crop((0, 0, width, height))]
+        y : int = height
+        for patches in json.loads(stack.image.info['patches']):
+            layer : SparseLayer = SparseLayer()
+            for x, py, w, h in patches:
+                layer.add((x, py), stack.crop((0, y, w, y + h)))
+                y += h
+            imgs.append(layer)
+        return imgs
+
+    # save the layers of a section in the disk cache
+    # the patches of the overlays are stacked under the base layer, their areas are stored in a text chunk
+    def save_section(self : GBFPIB, key : str, imgs : list[IMG|SparseLayer]) -> None:
+        width, height = imgs[0].image.size
+        areas : list[list[list[int]]] = [[[*offset, *patch.image.size] for offset, patch in layer.patches] for layer in imgs[1:]]
+        stack : Image = Image.new("RGBA", (width, height + sum(area[3] for layer in areas for area in layer)))
+        stack.paste(imgs[0].image, (0, 0))
+        y : int = height
+        for layer in imgs[1:]:
+            for offset, patch in layer.patches:
+                stack.paste(patch.image, (0, y))
+                y += patch.image.height
+        info : PngImagePlugin.PngInfo = PngImagePlugin.PngInfo()
+        info.add_text('patches', json.dumps(areas))
+        with BytesIO() as buffer:
+            stack.save(buffer, "PNG", compress_level=1, pnginfo=info)
+            self.disk_cache.insert(key, buffer.getvalue(), None)
+        stack.close()
+
+    async def make_party(self : GBFPIB, export : dict) -> str|tuple[str, DisplayList]:
         try:
-            imgs : list[IMG] = [self.blank_image(), self.blank_image()]
+            imgs : DisplayList = DisplayList(self.layer_count())
             print("[CHA] * Drawing Party...")
             # starting position
             pos = self.layout.party.start
@@ -1348,7 +2918,7 @@ class GBFPIB():
 
     async def make_summon(self : GBFPIB, export : dict) -> str|tuple:
         try:
-            imgs : list[IMG] = [self.blank_image(), self.blank_image()]
+            imgs : DisplayList = DisplayList(self.layer_count())
             print("[SUM] * Drawing Summons...")
             # background setup
             await self.paste(
@@ -1497,7 +3067,7 @@ class GBFPIB():
 
     async def make_weapon(self : GBFPIB, export : dict) -> str|tuple:
         try:
-            imgs = [self.blank_image(), self.blank_image()]
+            imgs = DisplayList(self.layer_count())
             self.multiline_text(
                 imgs, range(2),
                 (1540, 2125),
@@ -1908,7 +3478,7 @@ class GBFPIB():
                             font=self.fonts['medium']
                         )
             # hp gauge
-            if self.settings.get('hp', True):
+            if 'hp' in self.outputs:
                 await asyncio.sleep(0)
                 hpratio : int = 100
                 for et in export['estx']:
@@ -1966,7 +3536,7 @@ class GBFPIB():
 
     async def make_modifier(self : GBFPIB, export : dict) -> str|tuple:
         try:
-            imgs : list[IMG] = [self.blank_image()]
+            imgs : DisplayList = DisplayList(1)
             print("[MOD] * Drawing Modifiers...")
             print("[MOD] |--> Found", len(export['mods']), "modifier(s)...")
             # weapon modifier list
@@ -2040,10 +3610,8 @@ class GBFPIB():
             if id in self.emp_cache:
                 return self.emp_cache[id]
             else:
-                with open("emp/{}.json".format(id), mode="r", encoding="utf-8") as f:
-                    self.emp_cache[id] = json.load(f)
-                    await asyncio.sleep(0)
-                    return self.emp_cache[id]
+                self.emp_cache[id] = await self.run_io(self.read_json, "emp/{}.json".format(id))
+                return self.emp_cache[id]
         except:
             return None
 
@@ -2052,16 +3620,14 @@ class GBFPIB():
             if id in self.artifact_cache:
                 return self.artifact_cache[id]
             else:
-                with open("artifact/{}.json".format(id), mode="r", encoding="utf-8") as f:
-                    self.artifact_cache[id] = json.load(f)
-                    await asyncio.sleep(0)
-                    return self.artifact_cache[id]
+                self.artifact_cache[id] = await self.run_io(self.read_json, "artifact/{}.json".format(id))
+                return self.artifact_cache[id]
         except:
             return None
 
     async def make_emp(self : GBFPIB, export : dict) -> str|tuple:
         try:
-            imgs : list[IMG] = [self.blank_image()]
+            imgs : DisplayList = DisplayList(1)
             print("[EMP] * Drawing EMPs...")
             # first, we attempt to load emp files
             # get chara count
@@ -2237,16 +3803,7 @@ class GBFPIB():
                             0
                         )
                         if data.get('awakening', None) is not None:
-                            url : str = ""
-                            match data['awaktype']:
-                                case "Attack"|"攻撃":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/1.jpg"
-                                case "Defense"|"防御":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/2.jpg"
-                                case "Multiattack"|"連続攻撃":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/3.jpg"
-                                case _: # "Balanced"|"バランス"or others
-                                    pass
+                            url : str = self.AWAKENING_ICONS.get(data['awaktype'], "") # "Balanced"|"バランス"or others aren't drawn
                             if url != "":
                                 await self.pasteDL(
                                     imgs, range(1),
@@ -2274,15 +3831,7 @@ class GBFPIB():
                             apos2 = v2(IMAGE_SIZE.x - 420, pos.y + 85)
                         # awakening
                         if data.get('awakening', None) is not None:
-                            match data['awaktype']:
-                                case "Attack"|"攻撃":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/1.jpg"
-                                case "Defense"|"防御":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/2.jpg"
-                                case "Multiattack"|"連続攻撃":
-                                    url = "assets_en/img/sp/assets/item/npcarousal/s/3.jpg"
-                                case _: # "Balanced"|"バランス"or others
-                                    url = "assets/bal_awakening.png"
+                            url = self.AWAKENING_ICONS.get(data['awaktype'], "assets/bal_awakening.png") # "Balanced"|"バランス"or others
                             if url == "assets/bal_awakening.png":
                                 await self.paste(
                                     imgs, range(1),
@@ -2316,18 +3865,18 @@ class GBFPIB():
                                 text_color : tuple[int, int, int]
                                 match key:
                                     case 'domain':
-                                        icon_path = "assets_en/img/sp/ui/icon/ability/m/1426_3.png"
+                                        icon_path = self.EMP_EXTRA_ICONS[key]
                                         text_color = self.DOMAIN_COLOR
                                         lv = 0
                                         for el in data[key]:
                                             if el[2] is not None: lv += 1
                                         extra_txt = "Lv" + str(lv)
                                     case 'extra':
-                                        icon_path = "assets_en/img/sp/ui/icon/ability/m/2487_3.png"
+                                        icon_path = self.EMP_EXTRA_ICONS[key]
                                         text_color = self.RADIANCE_COLOR
                                         extra_txt = "Lv" + str(len(data[key]))
                                     case 'saint':
-                                        icon_path = "assets_en/img/sp/ui/icon/skill/skill_job_weapon.png"
+                                        icon_path = self.EMP_EXTRA_ICONS[key]
                                         text_color = self.SAINT_COLOR
                                         lv = [0, 0]
                                         for el in data[key]:
@@ -2372,7 +3921,7 @@ class GBFPIB():
 
     async def make_artifact(self : GBFPIB, export : dict) -> str|tuple:
         try:
-            imgs : list[IMG] = [self.blank_image()]
+            imgs : DisplayList = DisplayList(1)
             print("[ART] * Drawing Artifacts...")
             # first, we attempt to load emp files
             # get chara count
@@ -2487,97 +4036,158 @@ class GBFPIB():
         except Exception as e:
             return self.pexc(e)
 
-    def saveImage(self : GBFPIB, img : IMG, filename : str, resize : tuple|None = None) -> str|None:
+    def saveImage(self : GBFPIB, img : IMG, filename : str) -> str|None:
         try:
-            if resize is not None:
-                # using NEAREST as we're downscaling anyway
-                resized = img.resize(resize)
-                resized.image.save(filename, "PNG")
-            else:
+            filename = os.path.join(self.output_folder, filename)
+            with self.profiler.measure("save_png"):
+                # the images are drawn at their final size, no resize needed
                 img.image.save(filename, "PNG")
             print("[OUT] *'{}' has been generated".format(filename))
             return None
         except Exception as e:
             return self.pexc(e)
 
+    # save the image of an output (emp, artifact), named after it
+    def saveOutput(self : GBFPIB, name : str, img : IMG) -> str|None:
+        with self.profiler.output(name):
+            return self.saveImage(img, name + ".png")
+
     def clipboardToJSON(self : GBFPIB) -> dict:
         return json.loads(pyperclip.paste())
 
-    def clean_memory_caches(self : GBFPIB) -> None:
-        if len(self.cache.keys()) > 100:
-            print("* Cleaning File Memory Cache...")
-            tmp = {}
-            for k, v in self.cache.items():
-                if '/skill/' in k or '/zenith/' in k or len(k.split('/')) == 2: # keep important files
-                    tmp[k] = v
-            self.cache = tmp
-        if len(self.emp_cache.keys()) > 80:
-            print("* Cleaning EMP Memory Cache...")
-            self.emp_cache = {}
-        if len(self.artifact_cache.keys()) > 80:
-            print("* Cleaning Artifact Memory Cache...")
-            self.artifact_cache = {}
+    # load the exports of a batch, from a folder of .json files or from a .jsonl file (one export per line)
+    # return a list of (name, export), the name being used for the output folder
+    def loadBatch(self : GBFPIB, path : str) -> list[tuple[str, dict]]:
+        exports : list[tuple[str, dict]] = []
+        if os.path.isdir(path):
+            for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                if not entry.is_file() or not entry.name.endswith(".json"):
+                    continue
+                try:
+                    with open(entry.path, mode="r", encoding="utf-8") as f:
+                        exports.append((entry.name.removesuffix(".json"), json.load(f)))
+                except Exception as e:
+                    print("[BAT] * Skipping", entry.path, ":", e)
+        else:
+            stem : str = Path(path).stem
+            with open(path, mode="r", encoding="utf-8") as f:
+                for i, line in enumerate(f):
+                    if line.strip() == "":
+                        continue
+                    try:
+                        exports.append(("{}_{:04}".format(stem, i + 1), json.loads(line)))
+                    except Exception as e:
+                        print("[BAT] * Skipping line", i + 1, "of", path, ":", e)
+        return exports
+
+    # process an export, depending on its content (party, emp or artifact)
+    async def process(self : GBFPIB, export : dict) -> bool:
+        if export.get('ver', 0) < 2:
+            print("Your bookmark is outdated, please update it!")
+            return False
+        if 'emp' in export:
+            await self.generate_emp(export)
+        elif 'artifact' in export:
+            await self.generate_artifact(export)
+        else:
+            await self.generate_party(export)
+            await self.run_io(self.saveClasses)
+        return True
 
     async def generate(self : GBFPIB) -> bool: # main function
         try:
             self.running = True
             # get the data from clipboard
             export : dict = self.clipboardToJSON()
-            if export.get('ver', 0) < 2:
-                print("Your bookmark is outdated, please update it!")
+            # start
+            if not await self.process(export):
                 self.running = False
                 return False
-            # start
-            if 'emp' in export:
-                self.generate_emp(export)
-            elif 'artifact' in export:
-                self.generate_artifact(export)
-            else:
-                await self.generate_party(export)
-                self.saveClasses()
-                if self.gbftmr is not None:
-                    print("Do you want to make a thumbnail with this party? (Y to confirm)")
-                    if input().lower() == "y":
-                        try:
-                            await self.gbftmr.makeThumbnailManual(export)
-                        except Exception as xe:
-                            print(self.pexc(xe))
-                            print("The above exception occured while trying to generate the thumbnail")
+            if self.gbftmr is not None and 'emp' not in export and 'artifact' not in export:
+                print("Do you want to make a thumbnail with this party? (Y to confirm)")
+                if input().lower() == "y":
+                    try:
+                        await self.gbftmr.makeThumbnailManual(export)
+                    except Exception as xe:
+                        print(self.pexc(xe))
+                        print("The above exception occured while trying to generate the thumbnail")
             self.running = False
             return True
         except Exception as e:
+            await self.run_io(self.disk_cache.save)
             print(self.pexc(e))
             print("An error occured")
             print("Did you click the bookmark?")
             self.running = False
             return False
 
-    def completeBaseImages(self : GBFPIB, imgs : list, resize : tuple|None = None) -> None|str:
+    # render every export of a batch in its own folder, reusing the client, fonts and caches between them
+    async def generate_batch(self : GBFPIB, path : str, output : str) -> bool:
+        try:
+            self.running = True
+            exports : list[tuple[str, dict]] = await self.run_io(self.loadBatch, path)
+        except Exception as e:
+            print(self.pexc(e))
+            print("Couldn't load the batch", path)
+            self.running = False
+            return False
+        print("[BAT] *", len(exports), "export(s) found in", path)
+        start : float = time.time()
+        count : int = 0
+        failed : list[str] = []
+        for i, (name, export) in enumerate(exports):
+            print("[BAT] * Export {}/{}: {}".format(i + 1, len(exports), name))
+            self.output_folder = os.path.join(output, name)
+            try:
+                os.makedirs(self.output_folder, exist_ok=True)
+                if await self.process(export):
+                    count += 1
+                else:
+                    failed.append(name)
+            except Exception as e:
+                print(self.pexc(e))
+                failed.append(name)
+        self.output_folder = ""
+        await self.run_io(self.disk_cache.save)
+        elapsed : float = time.time() - start
+        print("[BAT] * {}/{} export(s) processed in {:.2f} seconds".format(count, len(exports), elapsed))
+        if elapsed > 0:
+            print("[BAT] * Throughput: {:.1f} render(s) per minute".format(count * 60 / elapsed))
+        if len(failed) > 0:
+            print("[BAT] * Failed:", ", ".join(failed))
+        self.running = False
+        return len(failed) == 0
+
+    def completeBaseImages(self : GBFPIB, imgs : list) -> None|str:
         # party - Merge the images and save the resulting image
-        for k in ['summon', 'weapon', 'modifier']:
-            imgs['party'][0] = imgs['party'][0].alpha(imgs[k][0])
-        ex = self.saveImage(imgs['party'][0], "party.png", resize)
+        with self.profiler.output('party'):
+            with self.profiler.measure("merge"):
+                for k in ['summon', 'weapon', 'modifier']:
+                    imgs['party'][0] = imgs['party'][0].alpha(imgs[k][0])
+            ex = self.saveImage(imgs['party'][0], "party.png")
         if ex is not None:
             return ex
-        # skin - Merge the images (if enabled) and save the resulting image
-        if self.settings.get('skin', True):
-            imgs['party'][1] = imgs['party'][0].alpha(imgs['party'][1]) # we don't close imgs['party'][0] in case its save process isn't finished
-            for k in ['summon', 'weapon']:
-                imgs['party'][1] = imgs['party'][1].alpha(imgs[k][1])
-            return self.saveImage(imgs['party'][1], "skin.png", resize)
+        # skin - Apply the overlays (if requested) on a copy of the party image and save the resulting image
+        if 'skin' in self.outputs:
+            with self.profiler.output('skin'):
+                with self.profiler.measure("merge"):
+                    skin : IMG = imgs['party'][0].copy()
+                    for k in ['party', 'summon', 'weapon']:
+                        imgs[k][1].apply(skin)
+                return self.saveImage(skin, "skin.png")
 
     async def generate_party(self : GBFPIB, export : dict) -> bool:
         if self.classes is None:
-            self.loadClasses()
-        self.clean_memory_caches()
+            await self.run_io(self.loadClasses)
+        self.coalesced = 0
+        self.profiler.reset(self.settings.get('trace', None) is not None)
+        self.display_lists = {} if self.settings.get('display_list', None) is not None else None
+        self.outputs = self.requested_outputs()
         start : float = time.time()
-        do_emp = self.settings.get('emp', False)
-        do_artifact = self.settings.get('artifact', False)
         if self.settings.get('caching', False):
-            self.checkDiskCache()
+            await self.run_io(self.disk_cache.load)
         self.quality = {'720p':1/3, '1080p':1/2, '4k':1}.get(self.settings.get('quality', '4k').lower(), 1/3)
         self.definition = {'720p':(600, 720), '1080p':(900, 1080), '4k':(1800, 2160)}.get(self.settings.get('quality', '4k').lower(), (600, 720))
-        resize = None if self.quality == 1 else self.definition
         print("* Image Quality ratio:", self.quality)
         print("* Image Definition:", self.definition)
         self.japanese = (export['lang'] == 'ja')
@@ -2589,40 +4199,45 @@ class GBFPIB():
         if self.extra_grid:
             print("* Extra Party Weapon Grid detected")
         if len(export['c']) > 8:
-            self.layout = GBFPIBLayout(PartyMode.babyl, self.extra_grid, len(export['mods']))
+            self.layout = GBFPIBLayout(PartyMode.babyl, self.extra_grid, len(export['mods']), self.quality)
             print("* Tower of Babyl Party detectd")
         elif len(export['c']) > 5:
-            self.layout = GBFPIBLayout(PartyMode.extended, self.extra_grid, len(export['mods']))
+            self.layout = GBFPIBLayout(PartyMode.extended, self.extra_grid, len(export['mods']), self.quality)
             print("* Extended Party detectd")
         else:
-            self.layout = GBFPIBLayout(PartyMode.normal, self.extra_grid, len(export['mods']))
+            self.layout = GBFPIBLayout(PartyMode.normal, self.extra_grid, len(export['mods']), self.quality)
 
-        if self.prev_lang != self.japanese:
+        if self.prev_lang != self.japanese or self.prev_scale != self.layout.scale:
             print("* Preparing Font...")
             if self.japanese:
-                self.fonts['big'] = ImageFont.truetype("assets/font_japanese.ttf", 72, encoding="unic")
-                self.fonts['medium'] = ImageFont.truetype("assets/font_japanese.ttf", 36, encoding="unic")
-                self.fonts['small'] = ImageFont.truetype("assets/font_japanese.ttf", 33, encoding="unic")
-                self.fonts['mini'] = ImageFont.truetype("assets/font_japanese.ttf", 27, encoding="unic")
+                self.fonts['big'] = ImageFont.truetype("assets/font_japanese.ttf", self.layout.scale_length(72), encoding="unic")
+                self.fonts['medium'] = ImageFont.truetype("assets/font_japanese.ttf", self.layout.scale_length(36), encoding="unic")
+                self.fonts['small'] = ImageFont.truetype("assets/font_japanese.ttf", self.layout.scale_length(33), encoding="unic")
+                self.fonts['mini'] = ImageFont.truetype("assets/font_japanese.ttf", self.layout.scale_length(27), encoding="unic")
             else:
-                self.fonts['big'] = ImageFont.truetype("assets/font_english.ttf", 90, encoding="unic")
-                self.fonts['medium'] = ImageFont.truetype("assets/font_english.ttf", 48, encoding="unic")
-                self.fonts['small'] = ImageFont.truetype("assets/font_english.ttf", 42, encoding="unic")
-                self.fonts['mini'] = ImageFont.truetype("assets/font_english.ttf", 36, encoding="unic")
+                self.fonts['big'] = ImageFont.truetype("assets/font_english.ttf", self.layout.scale_length(90), encoding="unic")
+                self.fonts['medium'] = ImageFont.truetype("assets/font_english.ttf", self.layout.scale_length(48), encoding="unic")
+                self.fonts['small'] = ImageFont.truetype("assets/font_english.ttf", self.layout.scale_length(42), encoding="unic")
+                self.fonts['mini'] = ImageFont.truetype("assets/font_english.ttf", self.layout.scale_length(36), encoding="unic")
         self.prev_lang = self.japanese
+        self.prev_scale = self.layout.scale
         
+        print("* Checking the section cache...")
+        makers : dict[str, Callable] = {'party':self.make_party, 'summon':self.make_summon, 'weapon':self.make_weapon, 'modifier':self.make_modifier}
+        cached : dict[str, tuple[str|None, list[IMG|SparseLayer]|None]] = dict(zip(makers, await asyncio.gather(*[self.lookup_section(name, export) for name in makers])))
+        print("* Planning assets...")
+        paths : list[str] = await self.plan_assets(export, {name for name, (key, imgs) in cached.items() if imgs is None})
         tasks = []
         imgs = {}
         async with asyncio.TaskGroup() as tg:
             print("* Starting...")
-            if do_emp: # only start if enabled
-                tasks.append(tg.create_task(self.make_emp(export)))
-            if do_artifact: # only start if enabled
-                tasks.append(tg.create_task(self.make_artifact(export)))
-            tasks.append(tg.create_task(self.make_party(export)))
-            tasks.append(tg.create_task(self.make_summon(export)))
-            tasks.append(tg.create_task(self.make_weapon(export)))
-            tasks.append(tg.create_task(self.make_modifier(export)))
+            tg.create_task(self.profiler.timed('prefetch', self.prefetch(paths))) # not in tasks, as it doesn't return images
+            if 'emp' in self.outputs: # only start if requested
+                tasks.append(tg.create_task(self.profiler.timed('make_emp', self.drawn(self.make_emp(export)))))
+            if 'artifact' in self.outputs: # only start if requested
+                tasks.append(tg.create_task(self.profiler.timed('make_artifact', self.drawn(self.make_artifact(export)))))
+            for name, maker in makers.items():
+                tasks.append(tg.create_task(self.profiler.timed('make_' + name, self.make_section(name, maker, export, *cached[name]))))
         for t in tasks:
             r = t.result()
             if isinstance(r, tuple):
@@ -2631,12 +4246,16 @@ class GBFPIB():
                 raise Exception("Exception error and traceback:\n" + r)
             # as soon as available, we start generating the final images
         tasks = []
+        eviction : asyncio.Task|None = None
         async with asyncio.TaskGroup() as tg:
-            tasks.append(tg.create_task(asyncio.to_thread(self.completeBaseImages, imgs, resize)))
-            if do_emp:
-                tasks.append(tg.create_task(asyncio.to_thread(self.saveImage, imgs['emp'][0], "emp.png", resize)))
-            if do_artifact:
-                tasks.append(tg.create_task(asyncio.to_thread(self.saveImage, imgs['artifact'][0], "artifact.png", resize)))
+            if self.settings.get('caching', False) and self.settings.get('cache_max_size', None) is not None:
+                eviction = tg.create_task(asyncio.to_thread(self.disk_cache.evict, self.settings['cache_max_size']))
+            # images are already drawn at the target definition, no resize needed
+            tasks.append(tg.create_task(self.profiler.timed('output_party', asyncio.to_thread(self.completeBaseImages, imgs))))
+            if 'emp' in self.outputs:
+                tasks.append(tg.create_task(self.profiler.timed('output_emp', asyncio.to_thread(self.saveOutput, 'emp', imgs['emp'][0]))))
+            if 'artifact' in self.outputs:
+                tasks.append(tg.create_task(self.profiler.timed('output_artifact', asyncio.to_thread(self.saveOutput, 'artifact', imgs['artifact'][0]))))
         for t in tasks:
             r = t.result()
             if r is not None:
@@ -2646,11 +4265,92 @@ class GBFPIB():
                 try: i.close()
                 except: pass
         end : float = time.time()
+        if eviction is not None and eviction.result()[0] > 0:
+            print("* Disk cache: {} file(s) evicted, {:.1f} MB freed".format(eviction.result()[0], eviction.result()[1] / 1048576))
         print("* Task completed with success!")
         print("* Ended in {:.2f} seconds".format(end - start))
+        if self.coalesced > 0:
+            print("* {} duplicate asset request(s) coalesced".format(self.coalesced))
+        mstats : dict[str, int] = self.cache.stats()
+        print("* Memory cache: {} image(s) ({} pinned), {:.1f}/{:.1f} MB, {} hit(s), {} miss(es), {} eviction(s)".format(mstats['entries'], mstats['pinned'], mstats['size'] / 1048576, mstats['max_size'] / 1048576, mstats['hits'], mstats['misses'], mstats['evictions']))
+        mstats = self.variant_cache.stats()
+        print("* Resized image cache: {} image(s), {:.1f}/{:.1f} MB, {} hit(s), {} miss(es), {} eviction(s)".format(mstats['entries'], mstats['size'] / 1048576, mstats['max_size'] / 1048576, mstats['hits'], mstats['misses'], mstats['evictions']))
+        mstats = self.section_cache.stats()
+        print("* Section cache: {} section(s), {:.1f}/{:.1f} MB, {} hit(s), {} miss(es), {} eviction(s)".format(mstats['entries'], mstats['size'] / 1048576, mstats['max_size'] / 1048576, mstats['hits'], mstats['misses'], mstats['evictions']))
+        if self.settings.get('caching', False):
+            await self.run_io(self.disk_cache.save)
+            stats : dict[str, int] = await self.run_io(self.disk_cache.stats)
+            print("* Disk cache: {} file(s), {:.1f} MB, {} hit(s), {} miss(es)".format(stats['files'], stats['size'] / 1048576, stats['hits'], stats['misses']))
+        mstats = self.disk_cache.missing.stats()
+        if mstats['entries'] > 0:
+            print("* Missing assets: {} known, {} request(s) saved".format(mstats['entries'], mstats['saved']))
+        if self.settings.get('report', None) is not None:
+            await self.run_io(self.saveReport, self.settings['report'], len(paths))
+        if self.settings.get('trace', None) is not None:
+            await self.run_io(self.saveTrace, self.settings['trace'])
+        if self.display_lists is not None:
+            await self.run_io(self.saveDisplayLists, self.settings['display_list'])
         return True
 
-    def generate_emp(self : GBFPIB, export : dict) -> None:
+    # write the display lists of the last render in a JSON file
+    def saveDisplayLists(self : GBFPIB, filename : str) -> None:
+        try:
+            filename = os.path.join(self.output_folder, filename)
+            with open(filename, mode="w", encoding="utf-8") as f:
+                json.dump({
+                    'quality':self.settings.get('quality', '4k'),
+                    'mode':self.layout.mode.name,
+                    'size':list(self.layout.canvas_size.i),
+                    'sections':self.display_lists
+                }, f, indent=1)
+            print("* Display lists saved to", filename)
+        except Exception as e:
+            print(self.pexc(e))
+            print("Couldn't save the display lists")
+
+    # write the trace events of the last render in a JSON file
+    def saveTrace(self : GBFPIB, filename : str) -> None:
+        try:
+            filename = os.path.join(self.output_folder, filename)
+            with open(filename, mode="w", encoding="utf-8") as f:
+                json.dump(self.profiler.chrome_trace(), f)
+            print("* Trace saved to", filename)
+        except Exception as e:
+            print(self.pexc(e))
+            print("Couldn't save the trace")
+
+    # write the timings of the last render in a JSON file
+    def saveReport(self : GBFPIB, filename : str, planned : int) -> None:
+        try:
+            filename = os.path.join(self.output_folder, filename)
+            data : dict[str, Any] = self.profiler.report({
+                'version':self.VERSION,
+                'date':time.strftime("%Y-%m-%dT%H:%M:%S"),
+                'quality':self.settings.get('quality', '4k'),
+                'mode':self.layout.mode.name,
+                'extra_grid':self.extra_grid,
+                'japanese':self.japanese,
+                'planned_assets':planned,
+                'coalesced':self.coalesced
+            })
+            data['caches'] = {
+                'memory':self.cache.stats(),
+                'variant':self.variant_cache.stats(),
+                'section':self.section_cache.stats()
+            }
+            if self.settings.get('caching', False):
+                data['caches']['disk'] = self.disk_cache.stats()
+            data['caches']['missing'] = self.disk_cache.missing.stats()
+            data['sources'] = [{'name':source.name} | source.stats() for source in self.get_sources()]
+            data['pool'] = self.pool_stats()
+            with open(filename, mode="w", encoding="utf-8") as f:
+                json.dump(data, f, indent=1)
+            print("* Run report saved to", filename)
+        except Exception as e:
+            print(self.pexc(e))
+            print("Couldn't save the run report")
+
+    async def generate_emp(self : GBFPIB, export : dict) -> None:
         if 'emp' not in export or 'id' not in export or 'ring' not in export:
             raise Exception("Invalid EMP data, check your bookmark")
         print("* Saving EMP for Character", export['id'], "...")
@@ -2672,13 +4372,12 @@ class GBFPIB():
             print("* No Extra Data found, please update your bookmark")
         else:
             print("* Extra #", len(export['extra']))
-        self.checkEMP()
+        await self.run_io(self.checkEMP)
         self.emp_cache[str(export['id'])] = export
-        with open('emp/{}.json'.format(export['id']), mode='w', encoding="utf-8") as outfile:
-            json.dump(export, outfile)
+        await self.run_io(write_json, 'emp/{}.json'.format(export['id']), export)
         print("* Task completed with success!")
 
-    def generate_artifact(self : GBFPIB, export : dict) -> None:
+    async def generate_artifact(self : GBFPIB, export : dict) -> None:
         if 'artifact' not in export:
             raise Exception("Invalid Artifact data, check your bookmark")
         print("* Saving Current Artifact for Character", export['id'], "...")
@@ -2692,10 +4391,9 @@ class GBFPIB():
                 export["artifact"]['skills'][i]['icon'] = "assets" + export["artifact"]['skills'][i]['icon'].split('/assets', 1)[1]
                 export["artifact"]['skills'][i]['lvl'] = export["artifact"]['skills'][i]['lvl'].split(' ')[-1]
                 print("*", "Skill", i+1, export["artifact"]['skills'][i]['icon'], export["artifact"]['skills'][i]['lvl'], export["artifact"]['skills'][i]['desc'], export["artifact"]['skills'][i]['value'])
-        self.checkArtifact()
+        await self.run_io(self.checkArtifact)
         self.artifact_cache[str(export['id'])] = export
-        with open('artifact/{}.json'.format(export['id']), mode='w', encoding="utf-8") as outfile:
-            json.dump(export, outfile)
+        await self.run_io(write_json, 'artifact/{}.json'.format(export['id']), export)
         print("* Task completed with success!")
 
     def checkEMP(self : GBFPIB) -> None: # check if emp folder exists (and create it if needed)
@@ -2706,9 +4404,176 @@ class GBFPIB():
         if not os.path.isdir('artifact'):
             os.mkdir('artifact')
 
-    def checkDiskCache(self : GBFPIB) -> None: # check if cache folder exists (and create it if needed)
-        if not os.path.isdir('cache'):
-            os.mkdir('cache')
+    # parse a boolean option of a server request
+    def server_flag(self : GBFPIB, request : web.Request, key : str, default : bool) -> bool:
+        value : str|None = request.query.get(key, None)
+        if value is None:
+            return default
+        return value.lower() in ("1", "true", "yes", "on")
+
+    # read the images rendered in the given folder, by file name
+    def readOutputs(self : GBFPIB, folder : str) -> dict[str, bytes]:
+        files : dict[str, bytes] = {}
+        for name in sorted(os.listdir(folder)):
+            with open(os.path.join(folder, name), "rb") as f:
+                files[name] = f.read()
+        return files
+
+    # process an export received in watch mode, without stopping on errors
+    async def watch_process(self : GBFPIB, export : dict) -> bool:
+        try:
+            self.running = True
+            return await self.process(export)
+        except Exception as e:
+            await self.run_io(self.disk_cache.save)
+            print(self.pexc(e))
+            print("An error occured")
+            return False
+        finally:
+            self.running = False
+            print("* Waiting for the next export...")
+
+    # keep running and process every new export found in the clipboard or, if set, in the given folder
+    # exports found in the folder are then moved to its 'done' or 'failed' sub-folder
+    async def watch(self : GBFPIB, folder : str|None) -> None:
+        if folder is None:
+            print("Watching the clipboard, click the bookmarklet to process an export")
+            previous : str = await asyncio.to_thread(pyperclip.paste) # ignore the current content
+        else:
+            print("Watching the folder '{}', drop .json exports in it to process them".format(folder))
+            for sub in ("done", "failed"):
+                os.makedirs(os.path.join(folder, sub), exist_ok=True)
+        print("Press Ctrl+C to stop")
+        while True:
+            await asyncio.sleep(self.WATCH_INTERVAL)
+            if folder is None:
+                content : str = await asyncio.to_thread(pyperclip.paste)
+                if content == previous:
+                    continue
+                previous = content
+                try:
+                    export : dict = json.loads(content)
+                    if not isinstance(export, dict) or 'ver' not in export:
+                        continue
+                except:
+                    continue # not an export
+                print("[WAT] * New export found in the clipboard")
+                await self.watch_process(export)
+            else:
+                for name in await self.run_io(self.scanWatchFolder, folder):
+                    print("[WAT] * New export found:", name)
+                    path : str = os.path.join(folder, name)
+                    try:
+                        export : dict = await self.run_io(self.read_json, path)
+                        result : bool = await self.watch_process(export)
+                    except Exception as e:
+                        print("[WAT] * Couldn't read", path, ":", e)
+                        result = False
+                    await self.run_io(os.replace, path, os.path.join(folder, "done" if result else "failed", name))
+
+    # return the names of the .json files of the watched folder, skipping those which might still be written
+    def scanWatchFolder(self : GBFPIB, folder : str) -> list[str]:
+        names : list[str] = []
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            if time.time() - entry.stat().st_mtime < self.WATCH_INTERVAL:
+                continue
+            names.append(entry.name)
+        return names
+
+    # start a local HTTP server rendering the exports it receives
+    # POST /render with the export as the JSON body
+    # query options: quality (720p, 1080p, 4k), skin, emp, artifact, hp (0 or 1) and format (zip or multipart)
+    # GET /status returns the cache statistics
+    async def serve(self : GBFPIB, host : str, port : int, limit : int) -> None:
+        workers : asyncio.Queue = asyncio.Queue() # idle renderers, limiting the number of renders at once
+        if self.classes is None:
+            await self.run_io(self.loadClasses)
+        for i in range(max(1, limit)):
+            workers.put_nowait(self.make_worker())
+        count : int = 0
+
+        async def render(request : web.Request) -> web.Response:
+            nonlocal count
+            try:
+                export : dict = await request.json()
+            except Exception:
+                return web.json_response({'error':'invalid JSON body'}, status=400)
+            quality : str = request.query.get('quality', self.settings.get('quality', '4k')).lower()
+            if quality not in ('720p', '1080p', '4k'):
+                return web.json_response({'error':'invalid quality: {}'.format(quality)}, status=400)
+            output : str = request.query.get('format', 'zip').lower()
+            if output not in ('zip', 'multipart'):
+                return web.json_response({'error':'invalid format: {}'.format(output)}, status=400)
+            worker : GBFPIB = await workers.get()
+            try:
+                worker.settings = self.settings.copy()
+                worker.settings.pop('report', None) # only images are returned
+                worker.settings.pop('trace', None)
+                worker.settings.pop('display_list', None)
+                worker.settings['quality'] = quality
+                for key in ('skin', 'emp', 'artifact', 'hp'):
+                    worker.settings[key] = self.server_flag(request, key, self.settings.get(key, key != 'hp'))
+                with tempfile.TemporaryDirectory() as folder:
+                    worker.output_folder = folder
+                    try:
+                        if not await worker.process(export):
+                            return web.json_response({'error':'outdated bookmark'}, status=400)
+                    except Exception as e:
+                        print(self.pexc(e))
+                        return web.json_response({'error':str(e)}, status=500)
+                    files : dict[str, bytes] = await self.run_io(self.readOutputs, folder)
+            finally:
+                worker.output_folder = ""
+                workers.put_nowait(worker)
+            count += 1
+            if len(files) == 0: # emp or artifact export, nothing to return
+                return web.json_response({'result':'saved'})
+            if output == 'multipart':
+                writer : aiohttp.MultipartWriter = aiohttp.MultipartWriter('mixed')
+                for name, data in files.items():
+                    part = writer.append(data, {'Content-Type':'image/png'})
+                    part.set_content_disposition('attachment', filename=name)
+                return web.Response(body=writer)
+            else:
+                with BytesIO() as buffer:
+                    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive: # PNG are already compressed
+                        for name, data in files.items():
+                            archive.writestr(name, data)
+                    return web.Response(
+                        body=buffer.getvalue(),
+                        content_type='application/zip',
+                        headers={'Content-Disposition':'attachment; filename="gbfpib.zip"'}
+                    )
+
+        async def status(request : web.Request) -> web.Response:
+            data : dict[str, Any] = {
+                'version':self.VERSION,
+                'renders':count,
+                'idle':workers.qsize(),
+                'memory_cache':self.cache.stats(),
+                'variant_cache':self.variant_cache.stats(),
+                'section_cache':self.section_cache.stats()
+            }
+            if self.settings.get('caching', False):
+                data['disk_cache'] = await self.run_io(self.disk_cache.stats)
+            data['missing'] = self.disk_cache.missing.stats()
+            data['sources'] = [{'name':source.name} | source.stats() for source in self.get_sources()]
+            return web.json_response(data)
+
+        app : web.Application = web.Application(client_max_size=16 * 1024 * 1024)
+        app.add_routes([web.post('/render', render), web.get('/status', status)])
+        runner : web.AppRunner = web.AppRunner(app)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, host, port).start()
+            print("Listening on http://{}:{} ({} render(s) at once)".format(host, port, workers.qsize()))
+            print("Press Ctrl+C to stop")
+            await asyncio.Event().wait() # run until cancelled
+        finally:
+            await runner.cleanup()
+            await self.run_io(self.disk_cache.save)
 
     def cpyBookmark(self : GBFPIB) -> bool:
         try:
@@ -2743,27 +4608,58 @@ class GBFPIB():
             return False
 
     async def start(self : GBFPIB) -> None:
+        # parse parameters
+        prog_name : str
+        try:
+            prog_name = sys.argv[0].replace('\\', '/').split('/')[-1]
+        except:
+            prog_name = "gbfpib.py" # fallback to default
+        # Set Argument Parser
+        parser : argparse.ArgumentParser = argparse.ArgumentParser(prog=prog_name, description="Granblue Fantasy Party Image Builder v{} https://github.com/MizaGBF/GBFPIB".format(self.VERSION))
+        settings = parser.add_argument_group('settings', 'commands to alter the script behavior.')
+        settings.add_argument('-q', '--quality', help="set the image size. Default is %(default)s", choices=['1080p', '720p', '4k'], default='4k')
+        settings.add_argument('-nd', '--nodiskcache', help="disable the use of the disk cache.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-nps', '--nopartyskin', help="disable the generation of skin.png.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-npe', '--nopartyemp', help="disable the generation of emp.png.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-npa', '--nopartyartifact', help="disable the generation of artifact.png.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-cms', '--cachemaxsize', help="set the maximum size of the disk cache (example: 2G). Unlimited by default.", type=size_argument, metavar='SIZE')
+        settings.add_argument('-ce', '--cacheevict', help="trim the disk cache to the size set with -cms and exit.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-mcs', '--memcachesize', help="set the maximum size of the image memory cache (example: 512M). Default is 512M.", type=size_argument, metavar='SIZE')
+        settings.add_argument('-mt', '--missingttl', help="set how long an asset missing from the CDN is remembered, in hours (0 to disable). Default is %(default)s", type=float, default=NegativeCache.TTL / 3600, metavar='HOURS')
+        settings.add_argument('-dv', '--diskvariants', help="also save the resized assets in the disk cache.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-ds', '--disksections', help="also save the drawn party, summon, weapon and modifier layers in the disk cache.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-ep', '--endpoint', help="set the GBF CDN endpoint.", nargs='?', const=".", metavar='URL')
+        settings.add_argument('-mi', '--mirror', help="look for the assets in the given folder (mirroring the CDN paths) before downloading them. Can be used multiple times.", action='append', metavar='FOLDER')
+        settings.add_argument('-pk', '--pack', help="look for the assets in the given asset pack before anywhere else. Can be used multiple times.", action='append', metavar='FILE')
+        settings.add_argument('-mp', '--makepack', help="pack the disk cache and the assets folder in the given file and exit.", metavar='FILE')
+        settings.add_argument('-ar', '--archive', help="look for the assets in the given ZIP file (mirroring the CDN paths) before downloading them. Can be used multiple times.", action='append', metavar='FILE')
+        settings.add_argument('-pd', '--paralleldraw', help="draw each part of the image on its own thread, to use several cores.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-hp', '--showhp', help="draw the HP slider on skin.png.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-tm', '--gbftmr', help="set the GBFMTR path.", nargs='?', const=".", metavar='GBFTMR')
+        settings.add_argument('-r', '--report', help="save the timings of the render in the given JSON file.", metavar='FILE')
+        settings.add_argument('-tr', '--trace', help="save a timeline of the render in the given JSON file, in the Chrome trace format (for Perfetto).", metavar='FILE')
+        settings.add_argument('-dl', '--displaylist', help="save the drawing operations of every drawn part of the image in the given JSON file.", metavar='FILE')
+        settings.add_argument('-w', '--wait', help="add a 10 seconds wait after the generation.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-wt', '--watch', help="keep running and process every new export copied to the clipboard.", action='store_const', const=True, default=False, metavar='')
+        settings.add_argument('-wd', '--watchdir', help="keep running and process every new .json export dropped in the given folder.", metavar='FOLDER')
+        settings.add_argument('-b', '--batch', help="render every export of a folder of .json files or of a .jsonl file, instead of the clipboard.", metavar='PATH')
+        settings.add_argument('-bo', '--batchoutput', help="set the folder where the batch images are saved, one sub-folder per export. Default is %(default)s", default='batch', metavar='FOLDER')
+        network = parser.add_argument_group('network', 'commands to tune the asset downloads.')
+        network.add_argument('-pl', '--poollimit', help="set the maximum number of open connections. Default is %(default)s", type=int, default=self.POOL_LIMIT, metavar='COUNT')
+        network.add_argument('-ph', '--poolhostlimit', help="set the maximum number of open connections to a same host. Default is %(default)s", type=int, default=self.POOL_HOST_LIMIT, metavar='COUNT')
+        network.add_argument('-rt', '--requesttimeout', help="set the timeout of a single download attempt, in seconds. Default is %(default)s", type=float, default=self.REQUEST_TIMEOUT, metavar='SECONDS')
+        network.add_argument('-rr', '--retries', help="set how many times a download is retried after a server error or a timeout. Default is %(default)s", type=int, default=self.RETRIES, metavar='COUNT')
+        server = parser.add_argument_group('server', 'commands to run a local render server.')
+        server.add_argument('-sv', '--server', help="start a HTTP server rendering the exports POSTed to /render.", action='store_const', const=True, default=False, metavar='')
+        server.add_argument('-sh', '--serverhost', help="set the server host. Default is %(default)s", default='127.0.0.1', metavar='HOST')
+        server.add_argument('-sp', '--serverport', help="set the server port. Default is %(default)s", type=int, default=8000, metavar='PORT')
+        server.add_argument('-sl', '--serverlimit', help="set the maximum number of renders running at once. Default is %(default)s", type=int, default=2, metavar='COUNT')
+        args : argparse.Namespace = parser.parse_args()
+        self.settings["pool_limit"] = args.poollimit
+        self.settings["pool_host_limit"] = args.poolhostlimit
+        self.settings["request_timeout"] = args.requesttimeout
+        self.settings["retries"] = args.retries
         async with self.init_client():
-            # parse parameters
-            prog_name : str
-            try:
-                prog_name = sys.argv[0].replace('\\', '/').split('/')[-1]
-            except:
-                prog_name = "gbfpib.py" # fallback to default
-            # Set Argument Parser
-            parser : argparse.ArgumentParser = argparse.ArgumentParser(prog=prog_name, description="Granblue Fantasy Party Image Builder v{} https://github.com/MizaGBF/GBFPIB".format(self.VERSION))
-            settings = parser.add_argument_group('settings', 'commands to alter the script behavior.')
-            settings.add_argument('-q', '--quality', help="set the image size. Default is %(default)s", choices=['1080p', '720p', '4k'], default='4k')
-            settings.add_argument('-nd', '--nodiskcache', help="disable the use of the disk cache.", action='store_const', const=True, default=False, metavar='')
-            settings.add_argument('-nps', '--nopartyskin', help="disable the generation of skin.png.", action='store_const', const=True, default=False, metavar='')
-            settings.add_argument('-npe', '--nopartyemp', help="disable the generation of emp.png.", action='store_const', const=True, default=False, metavar='')
-            settings.add_argument('-npa', '--nopartyartifact', help="disable the generation of artifact.png.", action='store_const', const=True, default=False, metavar='')
-            settings.add_argument('-ep', '--endpoint', help="set the GBF CDN endpoint.", nargs='?', const=".", metavar='URL')
-            settings.add_argument('-hp', '--showhp', help="draw the HP slider on skin.png.", action='store_const', const=True, default=False, metavar='')
-            settings.add_argument('-tm', '--gbftmr', help="set the GBFMTR path.", nargs='?', const=".", metavar='GBFTMR')
-            settings.add_argument('-w', '--wait', help="add a 10 seconds wait after the generation.", action='store_const', const=True, default=False, metavar='')
-            args : argparse.Namespace = parser.parse_args()
-
             if args.gbftmr is not None and self.importGBFTMR(args.gbftmr):
                 print("GBFTMR imported with success")
 
@@ -2775,8 +4671,41 @@ class GBFPIB():
             self.settings["emp"] = not args.nopartyemp
             self.settings["artifact"] = not args.nopartyartifact
             self.settings["hp"] = args.showhp
+            self.settings["parallel"] = args.paralleldraw
+            self.settings["cache_max_size"] = args.cachemaxsize
+            self.settings["variant_disk"] = args.diskvariants
+            self.settings["section_disk"] = args.disksections
+            self.settings["mirror"] = args.mirror
+            self.settings["archive"] = args.archive
+            self.settings["pack"] = args.pack
+            self.settings["report"] = args.report
+            self.settings["trace"] = args.trace
+            self.settings["display_list"] = args.displaylist
+            if args.memcachesize is not None:
+                self.cache.max_size = args.memcachesize
+            self.disk_cache.missing.ttl = args.missingttl * 3600
             print("Granblue Fantasy Party Image Builder", self.VERSION)
-            await self.generate()
+            if args.cacheevict:
+                if args.cachemaxsize is None:
+                    print("Please set the maximum size with -cms")
+                    return
+                count, freed = self.disk_cache.evict(args.cachemaxsize)
+                self.disk_cache.save()
+                stats : dict[str, int] = self.disk_cache.stats()
+                print("{} file(s) evicted, {:.1f} MB freed".format(count, freed / 1048576))
+                print("The disk cache contains {} file(s), {:.1f} MB".format(stats['files'], stats['size'] / 1048576))
+                return
+            if args.makepack is not None:
+                self.makePack(args.makepack)
+                return
+            if args.server:
+                await self.serve(args.serverhost, args.serverport, args.serverlimit)
+            elif args.batch is not None:
+                await self.generate_batch(args.batch, args.batchoutput)
+            elif args.watch or args.watchdir is not None:
+                await self.watch(args.watchdir)
+            else:
+                await self.generate()
             if args.wait:
                 print("Closing in 10 seconds...")
                 time.sleep(10)
@@ -0,0 +1,205 @@
+from __future__ import annotations
+import asyncio
+
+import os
+import io
+import random
+import hashlib
+import argparse
+import threading
+
+# third party
+import aiohttp
+from aiohttp import web
+from PIL import Image
+
+# Local stand-in of the GBF CDN, for offline testing and benchmarking
+# Use it with the endpoint option of gbfpib.py, for example: python gbfpib.py -ep http://127.0.0.1:8001/
+# Files are served from a folder of recorded assets (mirroring the CDN paths) if set
+# Missing files can be recorded from the real CDN, or replaced by generated placeholders
+
+# size of the placeholder images, per asset folder
+PLACEHOLDER_SIZES : dict[str, tuple[int, int]] = {
+    "/leader/s/":(180, 180),
+    "/npc/s/":(180, 180),
+    "/npc/f/":(207, 432),
+    "/npc/m/":(280, 160),
+    "/summon/party_main/":(280, 480),
+    "/summon/party_sub/":(280, 160),
+    "/summon/m/":(280, 160),
+    "/summon/ls/":(280, 160),
+    "/weapon/ls/":(280, 590),
+    "/weapon/m/":(280, 160),
+    "/artifact/":(207, 207),
+    "/weapon_skill_label/":(150, 38)
+}
+
+class LocalCDN():
+    UPSTREAM : str = "https://prd-game-a-granbluefantasy.akamaized.net/"
+
+    # folder: folder of recorded assets, None to not use one
+    # record: if True, files missing from the folder are downloaded from the real CDN and saved in it
+    # placeholders: if True, files still missing are replaced by generated images, else a 404 error is returned
+    # latency and jitter: delay added to every request, in seconds (the jitter is random, between 0 and its value)
+    # error_rate: ratio of requests failing with a 503 error
+    # seed: seed of the random generator, for repeatable runs
+    def __init__(self : LocalCDN, folder : str|None = None, record : bool = False, placeholders : bool = True, latency : float = 0, jitter : float = 0, error_rate : float = 0, seed : int|None = None) -> None:
+        self.folder : str|None = folder
+        self.record : bool = record and folder is not None
+        self.placeholders : bool = placeholders
+        self.latency : float = latency
+        self.jitter : float = jitter
+        self.error_rate : float = error_rate
+        self.random : random.Random = random.Random(seed)
+        self.generated : dict[str, bytes] = {} # placeholder cache
+        self.client : aiohttp.ClientSession|None = None
+        self.runner : web.AppRunner|None = None
+        self.url : str|None = None
+        self.loop : asyncio.AbstractEventLoop|None = None
+        self.stats : dict[str, int] = {'requests':0, 'served':0, 'recorded':0, 'generated':0, 'missing':0, 'errors':0}
+
+    # generate a placeholder, its color depends on the path
+    def placeholder(self : LocalCDN, path : str) -> bytes:
+        if path not in self.generated:
+            size : tuple[int, int] = (128, 128)
+            for k, v in PLACEHOLDER_SIZES.items():
+                if k in path:
+                    size = v
+                    break
+            color : bytes = hashlib.md5(path.encode('utf-8')).digest()
+            png : bool = path.endswith(".png")
+            img : Image = Image.new("RGBA" if png else "RGB", size, tuple(color[:4] if png else color[:3]))
+            with io.BytesIO() as buffer:
+                img.save(buffer, "PNG" if png else "JPEG")
+                self.generated[path] = buffer.getvalue()
+            img.close()
+        return self.generated[path]
+
+    # location of a path in the folder
+    def file_path(self : LocalCDN, path : str) -> str|None:
+        if self.folder is None:
+            return None
+        parts : list[str] = [p for p in path.split('/') if p not in ('', '.')]
+        if len(parts) == 0 or '..' in parts:
+            return None
+        return os.path.join(self.folder, *parts)
+
+    def read(self : LocalCDN, fp : str) -> bytes|None:
+        try:
+            with open(fp, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def write(self : LocalCDN, fp : str, data : bytes) -> None:
+        os.makedirs(os.path.dirname(fp), exist_ok=True)
+        with open(fp, "wb") as f:
+            f.write(data)
+
+    # return the content of the given path, or None if it doesn't exist
+    async def load(self : LocalCDN, path : str) -> bytes|None:
+        fp : str|None = self.file_path(path)
+        if fp is not None:
+            data : bytes|None = await asyncio.to_thread(self.read, fp)
+            if data is not None:
+                self.stats['served'] += 1
+                return data
+            if self.record:
+                async with self.client.get(self.UPSTREAM + path) as response:
+                    if response.status == 200:
+                        data = await response.read()
+                        await asyncio.to_thread(self.write, fp, data)
+                        self.stats['recorded'] += 1
+                        return data
+        if self.placeholders and path.endswith((".jpg", ".png")):
+            self.stats['generated'] += 1
+            return self.placeholder(path)
+        return None
+
+    async def handle(self : LocalCDN, request : web.Request) -> web.Response:
+        self.stats['requests'] += 1
+        if self.latency > 0 or self.jitter > 0:
+            await asyncio.sleep(self.latency + self.random.uniform(0, self.jitter))
+        if self.error_rate > 0 and self.random.random() < self.error_rate:
+            self.stats['errors'] += 1
+            return web.Response(status=503)
+        path : str = request.match_info['path']
+        try:
+            data : bytes|None = await self.load(path)
+        except Exception as e:
+            print("Failed to load", path, ":", e)
+            self.stats['errors'] += 1
+            return web.Response(status=502)
+        if data is None:
+            self.stats['missing'] += 1
+            return web.Response(status=404)
+        content_type : str = "image/png" if path.endswith(".png") else "image/jpeg"
+        if request.method == "HEAD":
+            return web.Response(headers={'Content-Type':content_type, 'Content-Length':str(len(data))})
+        return web.Response(body=data, content_type=content_type)
+
+    # start the server in the running event loop, return its url (a free port is used if port is 0)
+    async def start(self : LocalCDN, host : str = "127.0.0.1", port : int = 0) -> str:
+        if self.record:
+            self.client = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=20))
+        app : web.Application = web.Application()
+        app.add_routes([web.route('*', '/{path:.*}', self.handle)])
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, host, port).start()
+        self.url = "http://{}:{}/".format(host, self.runner.addresses[0][1])
+        return self.url
+
+    async def stop(self : LocalCDN) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+        if self.client is not None:
+            await self.client.close()
+
+    # start the server in a background thread, return its url
+    def start_thread(self : LocalCDN, host : str = "127.0.0.1", port : int = 0) -> str:
+        ready : threading.Event = threading.Event()
+        def run() -> None:
+            self.loop = asyncio.new_event_loop()
+            self.loop.run_until_complete(self.start(host, port))
+            ready.set()
+            self.loop.run_forever()
+        threading.Thread(target=run, daemon=True).start()
+        ready.wait()
+        return self.url
+
+async def serve(args : argparse.Namespace) -> None:
+    cdn : LocalCDN = LocalCDN(
+        folder=args.folder,
+        record=args.record,
+        placeholders=not args.noplaceholder,
+        latency=args.latency / 1000,
+        jitter=args.jitter / 1000,
+        error_rate=args.errors,
+        seed=args.seed
+    )
+    url : str = await cdn.start(args.host, args.port)
+    print("Local CDN running at", url)
+    print("Use it with: python gbfpib.py -ep", url)
+    print("Press Ctrl+C to stop")
+    try:
+        await asyncio.Event().wait() # run until cancelled
+    finally:
+        await cdn.stop()
+        print("Statistics:", ", ".join("{} {}".format(v, k) for k, v in cdn.stats.items()))
+
+if __name__ == "__main__":
+    parser : argparse.ArgumentParser = argparse.ArgumentParser(description="Local stand-in of the GBF CDN, for offline testing and benchmarking.")
+    parser.add_argument('-H', '--host', help="set the server host. Default is %(default)s", default='127.0.0.1')
+    parser.add_argument('-p', '--port', help="set the server port. Default is %(default)s", type=int, default=8001)
+    parser.add_argument('-f', '--folder', help="serve the files of this folder, mirroring the CDN paths.", metavar='FOLDER')
+    parser.add_argument('-r', '--record', help="download the files missing from the folder from the real CDN, and save them in it.", action='store_true')
+    parser.add_argument('-np', '--noplaceholder', help="return a 404 error for missing files, instead of a placeholder.", action='store_true')
+    parser.add_argument('-l', '--latency', help="add a delay to every request, in milliseconds. Default is %(default)s", type=float, default=0)
+    parser.add_argument('-j', '--jitter', help="add a random delay (between 0 and this value) to every request, in milliseconds. Default is %(default)s", type=float, default=0)
+    parser.add_argument('-e', '--errors', help="ratio of requests failing with a 503 error, between 0 and 1. Default is %(default)s", type=float, default=0)
+    parser.add_argument('-s', '--seed', help="seed of the random generator, for repeatable runs.", type=int)
+    try:
+        asyncio.run(serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass